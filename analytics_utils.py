@@ -1,6 +1,9 @@
 # Add a helper function to analyze and rank the primary domains (content sources) from a list of post URLs.
 from urllib.parse import urlparse
 
+from sentiment import engine as sentiment_engine, label_for
+from tokenizer import count_words, scan
+
 def get_source_distribution(urls):
     """Analyzes a list of URLs to determine the distribution of content sources (domains)."""
     counts = {}
@@ -140,16 +143,11 @@ def analyze_sentiment(texts):
 
 # AI Improvement (2026-02-20)
 # Add a helper function to extract top keywords, filtering out common stop words and punctuation.
+TOP_KEYWORDS_STOP_WORDS = frozenset({'the', 'and', 'for', 'with', 'this', 'that', 'from', 'was', 'are', 'but', 'not', 'have', 'has', 'they', 'what', 'who', 'how', 'about', 'will', 'your', 'their', 'can', 'all', 'more', 'just', 'when'})
+
 def get_top_keywords(texts, limit=20):
     """Extracts the most frequent meaningful keywords from a list of strings."""
-    stops = {'the', 'and', 'for', 'with', 'this', 'that', 'from', 'was', 'are', 'but', 'not', 'have', 'has', 'they', 'what', 'who', 'how', 'about', 'will', 'your', 'their', 'can', 'all', 'more', 'just', 'when'}
-    counts = {}
-    for text in texts:
-        for word in text.lower().split():
-            w = word.strip('.,!?:;"()')
-            if w not in stops and len(w) > 2:
-                counts[w] = counts.get(w, 0) + 1
-    return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+    return count_words(texts, stop_words=TOP_KEYWORDS_STOP_WORDS).most_common(limit)
 
 
 # AI Improvement (2026-02-22)
@@ -165,16 +163,8 @@ def calculate_trending_score(score, hours_old):
 # Add a helper function to extract top phrases (n-grams) for more contextual trending topic detection.
 def get_top_phrases(texts, n=2, limit=10):
     """Extracts the most common n-word phrases (n-grams) to identify context-rich trends."""
-    import re
-    from collections import Counter
-    phrases = []
-    for text in texts:
-        # Find all words with at least 3 characters
-        words = re.findall(r'\b\w{3,}\b', text.lower())
-        for i in range(len(words) - n + 1):
-            phrase = " ".join(words[i:i+n])
-            phrases.append(phrase)
-    return Counter(phrases).most_common(limit)
+    # Phrases are built from words with at least 3 characters
+    return scan(texts, min_length=3, n=n).ngram_counts.most_common(limit)
 
 
 # AI Improvement (2026-02-22)
@@ -204,22 +194,19 @@ def identify_content_type(url):
 
 # AI Improvement (2026-02-22)
 # Complete the basic sentiment analysis helper function to categorize text into positive, negative, and neutral buckets.
+sentiment_engine.add_lexicon(
+    'analytics_utils.analyze_sentiment',
+    {'excellent', 'good', 'great', 'best', 'amazing', 'useful', 'helpful', 'positive', 'success', 'win'},
+    {'bad', 'worst', 'terrible', 'awful', 'negative', 'failure', 'fail', 'problem', 'broken', 'sad'})
+
 def analyze_sentiment(texts):
     """Categorizes text content into positive, negative, or neutral buckets."""
-    pos_words = {'excellent', 'good', 'great', 'best', 'amazing', 'useful', 'helpful', 'positive', 'success', 'win'}
-    neg_words = {'bad', 'worst', 'terrible', 'awful', 'negative', 'failure', 'fail', 'problem', 'broken', 'sad'}
-    
     counts = {'positive': 0, 'neutral': 0, 'negative': 0}
-    for text in texts:
-        words = set(str(text).lower().split())
-        p_score = len(words & pos_words)
-        n_score = len(words & neg_words)
-        if p_score > n_score:
-            counts['positive'] += 1
-        elif n_score > p_score:
-            counts['negative'] += 1
-        else:
-            counts['neutral'] += 1
+    # Each distinct word counts once per text
+    scores = sentiment_engine.score_batch((str(text) for text in texts),
+                                          'analytics_utils.analyze_sentiment', distinct=True)
+    for score, _ in scores:
+        counts[label_for(score)] += 1
     return counts
 
 
@@ -4,145 +4,99 @@ Social Media Analytics - Reddit & Twitter Data Analyzer
 Analyzes posts, engagement, trends, and sentiment from social media
 """
 
-from flask import Flask, render_template, request, jsonify
-import praw
-import sqlite3
-from datetime import datetime, timedelta
+from flask import Flask, Response, render_template, request, jsonify
+from datetime import datetime, timedelta, timezone
 from collections import Counter
 import re
 import json
+import os
+import time
+
+import db
+import engagement
+import export
+import features
+import ingest
+import instrumentation
+import jobs
+import minhash
+import pipeline
+import rollups
+import search
+import sketches
+import trending
+from batch import analyze_many
+from cache import TTLCache
+from ratelimit import limiter as rate_limiter
+from reddit_client import registry as reddit_clients
+from sentiment import engine as sentiment_engine
+from sources import RedditSource, get_source
+from storage import init_db, load_history, save_analysis
+from tokenizer import count_words
 
 app = Flask(__name__)
 
-# Database setup
-def init_db():
-    """Initialize SQLite database"""
-    conn = sqlite3.connect('analytics.db')
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS reddit_posts
-                 (id TEXT PRIMARY KEY,
-                  subreddit TEXT,
-                  title TEXT,
-                  author TEXT,
-                  score INTEGER,
-                  num_comments INTEGER,
-                  created_utc INTEGER,
-                  url TEXT,
-                  selftext TEXT,
-                  fetched_at TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS analytics
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  source TEXT,
-                  query TEXT,
-                  total_posts INTEGER,
-                  avg_score REAL,
-                  top_words TEXT,
-                  created_at TIMESTAMP)''')
-    
-    conn.commit()
-    conn.close()
+# Recent /analyze results keyed by (source, query, limit, incremental)
+result_cache = TTLCache(maxsize=int(os.environ.get('RESULT_CACHE_SIZE', 256)),
+                        ttl=float(os.environ.get('RESULT_CACHE_TTL', 60)))
+
+# Upper bounds for /analyze/batch
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 8))
+BATCH_MAX_SUBREDDITS = int(os.environ.get('BATCH_MAX_SUBREDDITS', 100))
 
 init_db()
 
-def get_reddit_client():
-    """Create Reddit client (read-only mode)"""
-    # Using read-only mode - no authentication needed
-    reddit = praw.Reddit(
-        client_id='read_only_mode',
-        client_secret=None,
-        user_agent='Social Media Analytics v1.0'
-    )
-    return reddit
-
-def analyze_reddit(subreddit_name, limit=100):
-    """Fetch and analyze Reddit posts"""
+# Worker pool for /jobs, separate from the request threads
+job_manager = jobs.JobManager()
+
+# Background ingestion of INGEST_SUBREDDITS (None when not configured)
+ingest_scheduler = ingest.from_env()
+
+instrumentation.registry.register_gauges('result_cache', 'Result cache', result_cache.stats)
+instrumentation.registry.register_gauges('db_pool', 'SQLite connection pool', db.stats)
+instrumentation.registry.register_gauges('jobs', 'Background jobs', job_manager.stats)
+instrumentation.registry.register_gauges('reddit_ratelimit', 'Reddit rate limiter',
+                                         rate_limiter.stats)
+instrumentation.registry.register_gauges('reddit_clients', 'Reddit client registry',
+                                         reddit_clients.stats)
+instrumentation.registry.register_gauges('trending', 'Trending windows',
+                                         trending.tracker.stats)
+
+def sanitize_subreddit(name):
+    """Standardize subreddit input (handles 'r/python', URLs, etc.)"""
+    if not name:
+        return ''
+    return name.strip().rstrip('/').split('/')[-1]
+
+def analyze_source(source, subreddit_name, limit=100, batch_persist=True, incremental=False,
+                   progress=None, timer=None):
+    """Fetch and analyze posts from a PostSource (see pipeline.analyze)"""
+    if timer is None and instrumentation.enabled:
+        timer = instrumentation.StageTimer()
     try:
-        reddit = get_reddit_client()
-        subreddit = reddit.subreddit(subreddit_name)
-        
-        posts = []
-        word_counter = Counter()
-        hour_counter = Counter()
-        
-        for post in subreddit.hot(limit=limit):
-            # Store post data
-            post_data = {
-                'id': post.id,
-                'title': post.title,
-                'author': str(post.author),
-                'score': post.score,
-                'num_comments': post.num_comments,
-                'created_utc': post.created_utc,
-                'url': post.url,
-                'selftext': post.selftext[:500] if post.selftext else ''
-            }
-            posts.append(post_data)
-            
-            # Word frequency analysis
-            text = f"{post.title} {post.selftext}".lower()
-            words = re.findall(r'\b[a-z]{3,}\b', text)
-            word_counter.update(words)
-            
-            # Posts by hour
-            hour = datetime.fromtimestamp(post.created_utc).hour
-            hour_counter[hour] += 1
-            
-            # Save to database
-            save_post(post_data, subreddit_name)
-        
-        # Get top words (exclude common words)
-        stop_words = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 
-                      'can', 'her', 'was', 'one', 'our', 'out', 'this', 'that',
-                      'with', 'have', 'from', 'they', 'been', 'what', 'which'}
-        top_words = [(word, count) for word, count in word_counter.most_common(50) 
-                     if word not in stop_words][:20]
-        
-        # Calculate stats
-        avg_score = sum(p['score'] for p in posts) / len(posts) if posts else 0
-        avg_comments = sum(p['num_comments'] for p in posts) / len(posts) if posts else 0
-        
-        return {
-            'success': True,
-            'subreddit': subreddit_name,
-            'total_posts': len(posts),
-            'posts': sorted(posts, key=lambda x: x['score'], reverse=True)[:10],
-            'top_words': top_words,
-            'posts_by_hour': dict(sorted(hour_counter.items())),
-            'avg_score': round(avg_score, 2),
-            'avg_comments': round(avg_comments, 2)
-        }
-        
+        result = pipeline.analyze(source, subreddit_name, limit, batch_persist=batch_persist,
+                                  incremental=incremental, progress=progress, timer=timer)
     except Exception as e:
         return {'success': False, 'error': str(e)}
+    if timer is not None and instrumentation.enabled:
+        timer.observe()
+    save_analysis(source.name, subreddit_name, result)
+    return result
 
-def save_post(post_data, subreddit):
-    """Save post to database"""
-    conn = sqlite3.connect('analytics.db')
-    c = conn.cursor()
-    
-    try:
-        c.execute('''INSERT OR REPLACE INTO reddit_posts 
-                     (id, subreddit, title, author, score, num_comments, 
-                      created_utc, url, selftext, fetched_at)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (post_data['id'], subreddit, post_data['title'], 
-                   post_data['author'], post_data['score'], 
-                   post_data['num_comments'], post_data['created_utc'],
-                   post_data['url'], post_data['selftext'], 
-                   datetime.now()))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving post: {e}")
-    finally:
-        conn.close()
+def analyze_reddit(subreddit_name, limit=100, batch_persist=True, incremental=False):
+    """Fetch and analyze Reddit posts"""
+    return analyze_source(RedditSource(), subreddit_name, limit,
+                          batch_persist=batch_persist, incremental=incremental)
 
 @app.route('/')
 def index():
     """Main page"""
     return render_template('index.html')
 
+def result_cache_key(source, query, limit, incremental=False):
+    """Key of a run's body in result_cache, shared by /analyze, /analyze/stream and /jobs"""
+    return (source, query.strip().lower(), limit, incremental)
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """Analyze endpoint"""
@@ -150,30 +104,421 @@ def analyze():
     source = data.get('source', 'reddit')
     query = data.get('query', '')
     limit = int(data.get('limit', 100))
+    force_refresh = bool(data.get('force_refresh', False))
+    incremental = bool(data.get('incremental', False))
+    from_ingested = bool(data.get('from_ingested', False))
+    # Include stage and DB timings in the response (always a fresh run)
+    debug = bool(data.get('debug', False))
     
-    if source == 'reddit':
-        result = analyze_reddit(query, limit)
-        return jsonify(result)
-    else:
+    post_source = get_source(source)
+    if post_source is None:
         return jsonify({'success': False, 'error': 'Unsupported source'})
+    
+    # Answer from what the ingestion worker already stored, if anything
+    if from_ingested:
+        result = pipeline.stored_result(post_source, query)
+        if result is not None:
+            result['from_ingested'] = True
+            return jsonify(result)
+    
+    # Serve the already-serialized body for repeat queries
+    cache_key = result_cache_key(source, query, limit, incremental)
+    if not force_refresh and not debug:
+        body = result_cache.get(cache_key)
+        if body is not None:
+            return app.response_class(body, mimetype='application/json',
+                                      headers={'X-Cache': 'HIT'})
+    
+    timer = instrumentation.StageTimer() if debug else None
+    db_before = instrumentation.thread_db_totals()
+    result = analyze_source(post_source, query, limit, incremental=incremental, timer=timer)
+    start = time.perf_counter()
+    body = json.dumps(result)
+    serialize_seconds = time.perf_counter() - start
+    instrumentation.observe_stage('serialize', serialize_seconds)
+    if result.get('success'):
+        result_cache.set(cache_key, body)
+    if debug:
+        db_after = instrumentation.thread_db_totals()
+        result['debug'] = {
+            'stages_ms': {stage: round(seconds * 1000, 3)
+                          for stage, seconds in timer.stages().items()},
+            'serialize_ms': round(serialize_seconds * 1000, 3),
+            'db_statements': db_after[0] - db_before[0],
+            'db_ms': round((db_after[1] - db_before[1]) * 1000, 3),
+            'result_cache': result_cache.stats()
+        }
+        body = json.dumps(result)
+    return app.response_class(body, mimetype='application/json',
+                              headers={'X-Cache': 'MISS'})
 
-@app.route('/history')
-def history():
-    """Get analysis history"""
-    conn = sqlite3.connect('analytics.db')
-    c = conn.cursor()
+@app.route('/analyze/stream')
+def analyze_stream():
+    """Stream running analysis results as server-sent events
+    
+    Query parameters: source, query, limit, every (posts between updates)
+    and force_refresh. Emits 'partial' events while posts are processed,
+    then one 'done' event with the full result, or an 'error' event. A
+    result cached by a recent run is sent as the 'done' event right away.
+    """
+    source = request.args.get('source', 'reddit')
+    query = request.args.get('query', '')
+    limit = int(request.args.get('limit', 100))
+    every = max(int(request.args.get('every', pipeline.STREAM_EVERY)), 1)
+    force_refresh = request.args.get('force_refresh', '').lower() in ('1', 'true', 'yes')
     
-    c.execute('SELECT * FROM analytics ORDER BY created_at DESC LIMIT 10')
-    history = c.fetchall()
-    conn.close()
+    post_source = get_source(source)
+    cache_key = result_cache_key(source, query, limit)
+    cached = None if force_refresh or post_source is None else result_cache.get(cache_key)
     
-    return jsonify({'history': history})
+    def events():
+        if post_source is None:
+            yield sse_event('error', {'success': False, 'error': 'Unsupported source'})
+            return
+        if cached is not None:
+            yield f'event: done\ndata: {cached}\n\n'
+            return
+        try:
+            for result in pipeline.analyze_stream(post_source, query, limit, every):
+                if not result['done']:
+                    yield sse_event('partial', result)
+        except Exception as e:
+            yield sse_event('error', {'success': False, 'error': str(e)})
+            return
+        save_analysis(post_source.name, query, result)
+        body = json.dumps(result)
+        if result.get('success'):
+            result_cache.set(cache_key, body)
+        yield f'event: done\ndata: {body}\n\n'
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no',
+                             'X-Cache': 'HIT' if cached is not None else 'MISS'})
 
-if __name__ == '__main__':
-    print("🚀 Social Media Analytics Server Starting...")
-    print("📊 Navigate to: http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Start an analysis in the background; takes the same body as /analyze
+
+    A result cached by a recent run (unless force_refresh or debug is set)
+    becomes a job that finishes at once, so polling works the same way.
+    """
+    data = request.json
+    source = data.get('source', 'reddit')
+    query = data.get('query', '')
+    limit = int(data.get('limit', 100))
+    incremental = bool(data.get('incremental', False))
+    force_refresh = bool(data.get('force_refresh', False)) or bool(data.get('debug', False))
+    
+    post_source = get_source(source)
+    if post_source is None:
+        return jsonify({'success': False, 'error': 'Unsupported source'})
+    
+    cache_key = result_cache_key(source, query, limit, incremental)
+    cached = None if force_refresh else result_cache.get(cache_key)
+    
+    def run(job):
+        if cached is not None:
+            job.advance(limit)
+            return json.loads(cached)
+        result = analyze_source(post_source, query, limit, incremental=incremental, progress=job)
+        if result.get('success'):
+            result_cache.set(cache_key, json.dumps(result))
+        return result
+    
+    job = job_manager.submit(run, total=limit)
+    return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/jobs/{job.id}',
+                    'cached': cached is not None}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Progress of a job, with the result once it has finished"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/stats')
+def job_stats():
+    """Queued, running and retained job counts"""
+    return jsonify(job_manager.stats())
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze several subreddits concurrently"""
+    data = request.json
+    post_source = get_source(data.get('source', 'reddit'))
+    subreddits = [sanitize_subreddit(name) for name in data.get('subreddits', [])]
+    subreddits = [name for name in subreddits if name]
+    limit = int(data.get('limit', 100))
+    incremental = bool(data.get('incremental', False))
+    max_workers = min(int(data.get('max_workers', BATCH_MAX_WORKERS)), BATCH_MAX_WORKERS)
+    timeout = float(data.get('timeout', 30))
+    
+    if post_source is None:
+        return jsonify({'success': False, 'error': 'Unsupported source'})
+    if not subreddits:
+        return jsonify({'success': False, 'error': 'No subreddits given'})
+    if len(subreddits) > BATCH_MAX_SUBREDDITS:
+        return jsonify({'success': False,
+                        'error': f'At most {BATCH_MAX_SUBREDDITS} subreddits per batch'})
+    
+    result = analyze_many(lambda name: analyze_source(post_source, name, limit,
+                                                      incremental=incremental),
+                          subreddits, max_workers=max(max_workers, 1), timeout=timeout)
+    return jsonify(result)
+
+@app.route('/rankings')
+def rankings():
+    """Rank stored posts by an engagement metric and flag outliers"""
+    metric = request.args.get('metric', 'hot')
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    limit = min(int(request.args.get('limit', 20)), 100)
+    
+    try:
+        result = engagement.rank_stored_posts(metric, subreddit or None, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    result['success'] = True
+    return jsonify(result)
+
+@app.route('/features/summary')
+def features_summary():
+    """Sentiment, clickbait, content type and engagement averages from stored features"""
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    result = features.feature_summary(subreddit or None)
+    result['success'] = True
+    return jsonify(result)
+
+@app.route('/hourly')
+def hourly():
+    """Hour-of-day activity and peak hours from the hourly rollups"""
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    days = int(request.args.get('days', 0)) or None
+    tz_offset = int(request.args.get('tz_offset', 0))
+    
+    hours = rollups.hour_of_day(subreddit or None, days, tz_offset)
+    result = {'success': True, 'hours': hours}
+    result.update(rollups.peak_hours(hours))
+    return jsonify(result)
+
+@app.route('/duplicates')
+def duplicates():
+    """Stored posts that are near-duplicates of a stored post (post_id) or of some text (q)"""
+    post_id = request.args.get('post_id', '').strip()
+    text = request.args.get('q', '').strip()
+    if not post_id and not text:
+        return jsonify({'success': False, 'error': 'Pass a post_id or a q to compare against'})
+    threshold = float(request.args.get('threshold', minhash.DUPLICATE_THRESHOLD))
+    limit = max(min(int(request.args.get('limit', 20)), 100), 1)
+    
+    try:
+        posts = minhash.similar_posts(post_id or None, text, threshold, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'duplicates': posts})
+
+@app.route('/reposts')
+def reposts():
+    """Groups of near-duplicate stored posts; cross=1 keeps only groups spanning subreddits"""
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    threshold = float(request.args.get('threshold', minhash.DUPLICATE_THRESHOLD))
+    cross_only = request.args.get('cross', '0') not in ('0', '', 'false')
+    limit = max(min(int(request.args.get('limit', 20)), 100), 1)
+    
+    groups = minhash.duplicate_groups(subreddit or None, threshold, cross_only, limit)
+    return jsonify({'success': True, 'groups': groups})
+
+@app.route('/subreddits/similarity')
+def subreddits_similarity():
+    """Similarity of two subreddits (a, b), or the subreddits most similar to one (subreddit)"""
+    first = sanitize_subreddit(request.args.get('a', ''))
+    second = sanitize_subreddit(request.args.get('b', ''))
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    limit = max(min(int(request.args.get('limit', 10)), 100), 1)
+    
+    try:
+        if first and second:
+            result = minhash.subreddit_similarity(first, second)
+        elif subreddit:
+            result = {'subreddit': subreddit.lower(),
+                      'similar': minhash.similar_subreddits(subreddit, limit)}
+        else:
+            return jsonify({'success': False, 'error': 'Pass a and b, or subreddit'})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    result['success'] = True
+    return jsonify(result)
+
+@app.route('/words/top')
+def top_words():
+    """Approximate top words of a subreddit, or of all stored posts, from the word sketches"""
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    days = int(request.args.get('days', 0)) or None
+    limit = max(min(int(request.args.get('limit', 20)), 100), 1)
+    
+    result = sketches.top_words(subreddit or None, days, limit)
+    result['success'] = True
+    return jsonify(result)
+
+@app.route('/trending')
+def trending_terms():
+    """Terms and phrases rising in a subreddit's recent posts, most bursty first"""
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    if not subreddit:
+        return jsonify({'success': False, 'error': 'Please enter a subreddit name'})
+    kind = request.args.get('kind', 'all')
+    if kind not in ('all', 'terms', 'phrases'):
+        return jsonify({'success': False, 'error': f'Unknown kind {kind!r}'})
+    limit = max(min(int(request.args.get('limit', 20)), 100), 1)
+    
+    result = trending.tracker.top(subreddit, limit, kind)
+    result['success'] = True
+    return jsonify(result)
 
+@app.route('/search')
+def search_posts():
+    """Full-text search over stored post titles and bodies, best match first
+    
+    Filters: subreddit, since, until (ISO dates or datetimes, UTC unless an
+    offset is given). Pass the returned next_cursor as cursor to get the
+    following page.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'success': False, 'error': 'Please enter a search query'})
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    limit = max(min(int(request.args.get('limit', 20)), 100), 1)
+    
+    try:
+        since, until = (utc_timestamp(request.args[key]) if request.args.get(key) else None
+                        for key in ('since', 'until'))
+        start = time.perf_counter()
+        rows, next_cursor = search.search_posts(text, subreddit or None, since, until,
+                                                request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+    return jsonify({'success': True, 'results': rows, 'next_cursor': next_cursor,
+                    'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)})
+
+@app.route('/export', methods=['POST'])
+def create_export():
+    """Export stored posts to Parquet / Arrow IPC files under EXPORT_DIR in the background
+    
+    Body: format ('parquet' or 'arrow'), subreddit, and incremental to write
+    only posts fetched since the previous export. Poll status_url for the
+    written files and the new watermark.
+    """
+    data = request.json or {}
+    fmt = data.get('format', 'parquet')
+    if fmt not in export.FORMATS:
+        return jsonify({'success': False, 'error': f'Unknown format {fmt!r}'})
+    subreddit = sanitize_subreddit(data.get('subreddit', ''))
+    incremental = bool(data.get('incremental', False))
+    
+    def run(job):
+        result = export.export_posts(export.EXPORT_DIR, fmt, subreddit or None,
+                                     incremental=incremental, progress=job)
+        result['success'] = True
+        return result
+    
+    job = job_manager.submit(run)
+    return jsonify({'success': True, 'job_id': job.id, 'status_url': f'/jobs/{job.id}'}), 202
+
+def utc_timestamp(value):
+    """Epoch seconds for an ISO date or datetime, read as UTC when it has no offset"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def create_app(start_ingest=True):
+    """The WSGI app, with background ingestion started when INGEST_SUBREDDITS is set
+
+    Serve `app:create_app()` (e.g. gunicorn 'app:create_app()') rather than
+    `app:app` to run the ingest scheduler in the web process; use a single
+    worker process so subreddits aren't polled once per worker.
+    """
+    if start_ingest and ingest_scheduler is not None:
+        ingest_scheduler.start()
+    return app
+
+@app.cli.command('ingest')
+def ingest_command():
+    """Run the INGEST_SUBREDDITS scheduler in the foreground"""
+    ingest.main()
+
+@app.teardown_appcontext
+def release_db_connection(error):
+    """Hand the request thread's connection back to the pool"""
+    db.release_connection()
+
+@app.before_request
+def start_request_timer():
+    if instrumentation.enabled:
+        request.started_at = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    if instrumentation.enabled and hasattr(request, 'started_at'):
+        endpoint = request.endpoint or 'unknown'
+        instrumentation.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - request.started_at,
+                                                     endpoint)
+        instrumentation.HTTP_REQUESTS.inc(endpoint, response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of timings, cache and queue stats"""
+    return app.response_class(instrumentation.registry.render(),
+                              mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Result cache counters"""
+    return jsonify(result_cache.stats())
+
+@app.route('/clients/stats')
+def client_stats():
+    """Reddit client registry counters"""
+    return jsonify(reddit_clients.stats())
+
+@app.route('/ingest/status')
+def ingest_status():
+    """Background ingestion counters per subreddit"""
+    if ingest_scheduler is None:
+        return jsonify({'running': False, 'subreddits': {}})
+    return jsonify(ingest_scheduler.stats())
+
+@app.route('/ratelimit/stats')
+def ratelimit_stats():
+    """Reddit request queue depth, wait times and rate-limit state"""
+    return jsonify(rate_limiter.stats())
+
+@app.route('/history')
+def history():
+    """Get analysis history, newest first
+    
+    Filters: subreddit, since, until (ISO dates or datetimes, UTC unless an
+    offset is given). Pass the returned next_cursor as cursor to get the
+    following page.
+    """
+    subreddit = sanitize_subreddit(request.args.get('subreddit', ''))
+    limit = max(min(int(request.args.get('limit', 10)), 100), 1)
+    
+    try:
+        since, until = (utc_timestamp(request.args[key]) if request.args.get(key) else None
+                        for key in ('since', 'until'))
+        rows, next_cursor = load_history(subreddit or None, since, until,
+                                         request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+    return jsonify({'success': True, 'history': rows, 'next_cursor': next_cursor})
 
 # AI Improvement (2026-02-16)
 # Add a text cleaning helper function for word frequency analysis
@@ -204,24 +549,6 @@ def analyze_sentiment(text):
     return 'positive' if score > 0 else 'negative' if score < 0 else 'neutral'
 
 
-# AI Improvement (2026-02-16)
-# Add a helper function to sanitize subreddit name inputs
-def sanitize_subreddit(name):
-    """Standardize subreddit input (handles 'r/python', URLs, etc.)"""
-    if not name:
-        return ''
-    return name.strip().rstrip('/').split('/')[-1]
-
-
-
-# AI Improvement (2026-02-16)
-# Expand the database schema to include a sentiment_score column for persisting analysis results
-                  score INTEGER,
-                  num_comments INTEGER,
-                  created_utc INTEGER,
-                  sentiment_score REAL)''')
-
-
 # AI Improvement (2026-02-16)
 # Add a helper function to calculate 'post velocity' (score per hour)
 def calculate_post_velocity(score, created_utc):
@@ -252,12 +579,14 @@ def get_peak_activity_hour(posts):
 
 # AI Improvement (2026-02-17)
 # Add a basic keyword-based sentiment analysis helper function to process post titles
+sentiment_engine.add_lexicon(
+    'app.analyze_sentiment',
+    {'upvote', 'good', 'great', 'awesome', 'interesting', 'cool', 'best', 'love', 'helpful'},
+    {'downvote', 'bad', 'terrible', 'awful', 'boring', 'worst', 'hate', 'annoying', 'useless'})
+
 def analyze_sentiment(text):
     """Perform basic keyword-based sentiment analysis on a string."""
-    pos = {'upvote', 'good', 'great', 'awesome', 'interesting', 'cool', 'best', 'love', 'helpful'}
-    neg = {'downvote', 'bad', 'terrible', 'awful', 'boring', 'worst', 'hate', 'annoying', 'useless'}
-    words = re.findall(r'\w+', text.lower())
-    return sum(1 for w in words if w in pos) - sum(1 for w in words if w in neg)
+    return sentiment_engine.score(text, 'app.analyze_sentiment')[0]
 
 
 # AI Improvement (2026-02-17)
@@ -292,15 +621,11 @@ def calculate_trending_score(score, num_comments, created_utc):
 
 # AI Improvement (2026-02-17)
 # Add a helper function to extract meaningful keywords by filtering out common stop words.
+FILTERED_KEYWORDS_STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'to', 'of', 'in', 'for', 'with', 'on', 'at', 'by', 'from', 'up', 'about', 'into', 'over', 'after', 'that', 'this', 'who', 'what', 'where', 'when', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can', 'will', 'just', 'should', 'now', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'me', 'him', 'them', 'us'})
+
 def get_filtered_keywords(titles, limit=20):
     """Extracts significant keywords from titles by filtering out common stop words."""
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'to', 'of', 'in', 'for', 'with', 'on', 'at', 'by', 'from', 'up', 'about', 'into', 'over', 'after', 'that', 'this', 'who', 'what', 'where', 'when', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can', 'will', 'just', 'should', 'now', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'me', 'him', 'them', 'us'}
-    all_words = []
-    for title in titles:
-        if not title: continue
-        words = re.findall(r'\\w+', title.lower())
-        all_words.extend([w for w in words if w not in stop_words and len(w) > 2])
-    return Counter(all_words).most_common(limit)
+    return count_words(titles, stop_words=FILTERED_KEYWORDS_STOP_WORDS).most_common(limit)
 
 
 # AI Improvement (2026-02-17)
@@ -318,13 +643,14 @@ def calculate_subreddit_similarity(keywords_one, keywords_two):
 
 # AI Improvement (2026-02-18)
 # Add a helper function to perform basic lexicon-based sentiment analysis on post titles.
+sentiment_engine.add_lexicon(
+    'app.get_sentiment_label',
+    {'excellent', 'great', 'good', 'amazing', 'love', 'best', 'awesome', 'incredible', 'positive', 'win'},
+    {'terrible', 'bad', 'awful', 'worst', 'hate', 'poor', 'negative', 'fail', 'disappointing', 'horrible'})
+
 def get_sentiment_label(text):
     """Categorizes text as Positive, Negative, or Neutral based on a predefined word list."""
-    pos_words = {'excellent', 'great', 'good', 'amazing', 'love', 'best', 'awesome', 'incredible', 'positive', 'win'}
-    neg_words = {'terrible', 'bad', 'awful', 'worst', 'hate', 'poor', 'negative', 'fail', 'disappointing', 'horrible'}
-    tokens = [w.strip('.,!?:;') for w in text.lower().split()]
-    score = sum(1 for word in tokens if word in pos_words) - sum(1 for word in tokens if word in neg_words)
-    return 'Positive' if score > 0 else 'Negative' if score < 0 else 'Neutral'
+    return sentiment_engine.label(text, 'app.get_sentiment_label').capitalize()
 
 
 # AI Improvement (2026-02-18)
@@ -392,3 +718,11 @@ def calculate_relative_engagement(score, comments, subscribers):
         return 0.0
     # Calculate engagement per 1,000 subscribers for better readability
     return round(((score + comments) / subscribers) * 1000, 4)
+
+
+if __name__ == '__main__':
+    print("🚀 Social Media Analytics Server Starting...")
+    print("📊 Navigate to: http://localhost:5000")
+    # Only in the serving process, not the debug reloader's parent
+    create_app(start_ingest=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,125 @@
+"""
+Concurrent multi-subreddit analysis over a bounded thread pool.
+"""
+
+import heapq
+import math
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def run_bounded(fn, items, max_workers=8, timeout=30.0, poll_interval=0.05):
+    """Call fn(item) for every item on at most max_workers threads.
+
+    Each item gets `timeout` seconds from the moment it starts running.
+    Items still queued when every wave should have finished are given up
+    on as well. Returns {item: outcome} where outcome has a 'status' of
+    'ok', 'error' or 'timeout' plus the result or error message.
+    """
+    items = list(dict.fromkeys(items))
+    if not items:
+        return {}
+
+    started = {}
+
+    def call(item):
+        started[item] = time.monotonic()
+        value = fn(item)
+        return value, time.monotonic() - started[item]
+
+    waves = math.ceil(len(items) / max_workers)
+    deadline = time.monotonic() + timeout * waves
+    outcomes = {}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+    futures = {executor.submit(call, item): item for item in items}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = futures[future]
+                try:
+                    value, elapsed = future.result()
+                    outcomes[item] = {'status': 'ok', 'result': value,
+                                      'elapsed_ms': round(elapsed * 1000, 2)}
+                except Exception as e:
+                    outcomes[item] = {'status': 'error', 'error': str(e)}
+
+            now = time.monotonic()
+            for future in list(pending):
+                item = futures[future]
+                began = started.get(item)
+                if (began is not None and now - began > timeout) or now > deadline:
+                    future.cancel()
+                    pending.discard(future)
+                    outcomes[item] = {'status': 'timeout',
+                                      'error': f'No result after {timeout}s'}
+    finally:
+        # Don't wait for stuck workers; they finish (and are discarded) in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return {item: outcomes[item] for item in items}
+
+
+def combine_results(results):
+    """Merge successful per-subreddit analyses into one summary.
+
+    Combined top_words are summed from each subreddit's own top list, so
+    they are exact only for words that made every list they appear in.
+    """
+    total_posts = 0
+    score_sum = 0.0
+    comments_sum = 0.0
+    posts_by_hour = Counter()
+    word_counts = Counter()
+    top_posts = []
+
+    for name, result in results.items():
+        count = result['total_posts']
+        total_posts += count
+        score_sum += result['avg_score'] * count
+        comments_sum += result['avg_comments'] * count
+        posts_by_hour.update({int(h): n for h, n in result['posts_by_hour'].items()})
+        word_counts.update(dict(result['top_words']))
+        top_posts.extend(dict(post, subreddit=name) for post in result['posts'])
+
+    return {
+        'subreddits': len(results),
+        'total_posts': total_posts,
+        'avg_score': round(score_sum / total_posts, 2) if total_posts else 0,
+        'avg_comments': round(comments_sum / total_posts, 2) if total_posts else 0,
+        'posts_by_hour': dict(sorted(posts_by_hour.items())),
+        'top_words': word_counts.most_common(20),
+        'posts': heapq.nlargest(10, top_posts, key=lambda x: x['score'])
+    }
+
+
+def analyze_many(analyze_fn, subreddits, max_workers=8, timeout=30.0):
+    """Run analyze_fn(subreddit) concurrently and summarize the successes.
+
+    analyze_fn follows analyze_reddit's contract: it returns a dict with
+    'success' and either the analysis or an 'error'.
+    """
+    start = time.perf_counter()
+    outcomes = run_bounded(analyze_fn, subreddits, max_workers=max_workers, timeout=timeout)
+
+    results = {}
+    failed = {}
+    for name, outcome in outcomes.items():
+        if outcome['status'] == 'ok' and outcome['result'].get('success'):
+            results[name] = outcome['result']
+            results[name]['elapsed_ms'] = outcome['elapsed_ms']
+        elif outcome['status'] == 'ok':
+            failed[name] = {'status': 'error', 'error': outcome['result'].get('error')}
+        else:
+            failed[name] = {'status': outcome['status'], 'error': outcome['error']}
+
+    return {
+        'success': bool(results),
+        'results': results,
+        'failed': failed,
+        'summary': combine_results(results),
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    }
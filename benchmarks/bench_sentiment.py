@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: compiled sentiment engine vs. the per-call helpers it replaced.
+
+The legacy path mirrors the old helpers: word sets built on every call and
+two passes over the tokens, one for positive and one for negative words.
+
+    python benchmarks/bench_sentiment.py --texts 20000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment import SentimentEngine  # noqa: E402
+
+VOCABULARY = ('python data release new update how to learn the and for with this that '
+              'model training broken amazing great question help library performance '
+              'good bad love hate best worst helpful useless awesome terrible 2024').split()
+
+POSITIVE = ('great', 'good', 'excellent', 'amazing', 'helpful', 'awesome', 'best', 'love')
+NEGATIVE = ('bad', 'awful', 'terrible', 'worst', 'horrible', 'useless', 'wrong', 'hate')
+
+
+def make_titles(count, seed=42):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(5, 15))).capitalize() + '!'
+            for _ in range(count)]
+
+
+def legacy_score(text):
+    pos_words = set(POSITIVE)
+    neg_words = set(NEGATIVE)
+    tokens = re.findall(r'\w+', text.lower())
+    if not tokens:
+        return 0.0
+    score = sum(1 for word in tokens if word in pos_words) - sum(1 for word in tokens if word in neg_words)
+    return round(score / len(tokens), 4)
+
+
+def legacy_scores(texts):
+    return [legacy_score(text) for text in texts]
+
+
+ENGINE = SentimentEngine({'bench': (POSITIVE, NEGATIVE)})
+
+
+def engine_scores(texts):
+    return [round(score / count, 4) if count else 0.0
+            for score, count in ENGINE.score_batch(texts)]
+
+
+def best_of(fn, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(texts)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--texts', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = make_titles(args.texts)
+    assert legacy_scores(texts) == engine_scores(texts)
+
+    legacy = best_of(legacy_scores, texts, args.repeat)
+    engine = best_of(engine_scores, texts, args.repeat)
+    print(f'{args.texts} texts, polarity score')
+    print(f'  legacy : {legacy * 1000:8.1f} ms  {args.texts / legacy:10.0f} texts/s')
+    print(f'  engine : {engine * 1000:8.1f} ms  {args.texts / engine:10.0f} texts/s')
+    print(f'  speedup: {legacy / engine:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Micro-benchmark: shared tokenizer vs. the per-helper tokenizing it replaced.
+
+The legacy path mirrors the old helpers: a stop-word set built on every
+call and a separate regex pass for keywords and for phrases.
+
+    python benchmarks/bench_tokenizer.py --texts 20000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import scan  # noqa: E402
+
+VOCABULARY = ('python data release new update how to learn the and for with this that '
+              'model training broken amazing great question help library performance '
+              'async rust web api database sql error best guide tutorial 2024').split()
+
+
+def make_titles(count, seed=42):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(5, 15))).capitalize() + '?'
+            for _ in range(count)]
+
+
+def legacy_keywords_and_phrases(texts, n=2):
+    stops = {'the', 'and', 'for', 'with', 'this', 'that', 'from', 'was', 'are', 'but', 'not',
+             'have', 'has', 'they', 'what', 'who', 'how', 'about', 'will', 'your', 'their'}
+    words = []
+    for text in texts:
+        words.extend(w for w in re.findall(r'\b\w{3,}\b', text.lower()) if w not in stops)
+    phrases = []
+    for text in texts:
+        tokens = re.findall(r'\b\w{3,}\b', text.lower())
+        for i in range(len(tokens) - n + 1):
+            phrases.append(' '.join(tokens[i:i + n]))
+    return Counter(words), Counter(phrases)
+
+
+STOPS = frozenset({'the', 'and', 'for', 'with', 'this', 'that', 'from', 'was', 'are', 'but', 'not',
+                   'have', 'has', 'they', 'what', 'who', 'how', 'about', 'will', 'your', 'their'})
+
+
+def shared_keywords_and_phrases(texts, n=2):
+    result = scan(texts, stop_words=STOPS, min_length=3, n=n)
+    return result.word_counts, result.ngram_counts
+
+
+def best_of(fn, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(texts)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--texts', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = make_titles(args.texts)
+    assert legacy_keywords_and_phrases(texts) == shared_keywords_and_phrases(texts)
+
+    legacy = best_of(legacy_keywords_and_phrases, texts, args.repeat)
+    shared = best_of(shared_keywords_and_phrases, texts, args.repeat)
+    print(f'{args.texts} texts, keywords + bigrams')
+    print(f'  legacy : {legacy * 1000:8.1f} ms  {args.texts / legacy:10.0f} texts/s')
+    print(f'  shared : {shared * 1000:8.1f} ms  {args.texts / shared:10.0f} texts/s')
+    print(f'  speedup: {legacy / shared:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Benchmark suite: the analysis pipeline on 1k/10k/100k-post corpora plus a
+micro-benchmark for every helper in utils.py, analytics_utils.py,
+utils/analytics.py and utils/text_processing.py.
+
+Each benchmark records throughput, p50/p99 latency and peak traced memory.
+Results are written as JSON and compared against a stored baseline; any
+benchmark that got slower (or hungrier) than the threshold is flagged and
+the run exits non-zero.
+
+    python benchmarks/run.py --save-baseline          # record a baseline
+    python benchmarks/run.py                          # compare against it
+    python benchmarks/run.py --suite helpers --filter sentiment
+    python benchmarks/run.py --corpus fixtures/python.jsonl --sizes 1000
+"""
+
+import argparse
+import importlib.util
+import inspect
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import pipeline  # noqa: E402
+from sources import DbReplaySource, JsonlReplaySource, normalize_record, write_jsonl  # noqa: E402
+from storage import init_db  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_OUT = os.path.join(BENCH_DIR, 'results.json')
+
+# Helper modules, loaded by path (the utils/ directory is shadowed by utils.py)
+HELPER_MODULES = ('utils.py', 'analytics_utils.py', 'utils/analytics.py',
+                  'utils/text_processing.py')
+
+VOCABULARY = ('python data release new update how to learn the and for with this that '
+              'model training broken amazing great question help library performance '
+              'async rust web api database sql error best guide tutorial 2024 good bad '
+              'love hate awesome terrible useful worst'.split())
+URLS = ('https://i.redd.it/abc.png', 'https://youtu.be/xyz', 'https://github.com/org/repo',
+        'https://www.reddit.com/r/python/comments/abc/title/', 'https://example.com/post')
+
+
+# Corpora
+
+def make_posts(count, seed=42, now=None):
+    """Deterministic synthetic post records"""
+    rng = random.Random(seed)
+    now = time.time() if now is None else now
+    posts = []
+    for i in range(count):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(5, 15))]
+        body = [rng.choice(VOCABULARY) for _ in range(rng.choice((0, 0, 20, 60)))]
+        posts.append({
+            'id': f'b{i}',
+            'subreddit': rng.choice(('python', 'learnpython', 'datascience')),
+            'title': ' '.join(words).capitalize() + rng.choice(('', '?', '!')),
+            'author': f'user{rng.randint(1, 500)}',
+            'score': int(rng.paretovariate(1.2)) * 10,
+            'num_comments': rng.randint(0, 300),
+            'created_utc': now - rng.randint(0, 30 * 86400),
+            'url': rng.choice(URLS),
+            'selftext': ' '.join(body)
+        })
+    return posts
+
+
+def load_corpus(path, count):
+    """Up to count records from a recorded JSONL fixture, repeated if it's shorter"""
+    with open(path, encoding='utf-8') as f:
+        records = [normalize_record(json.loads(line)) for line in f if line.strip()]
+    if not records:
+        raise ValueError(f'{path} has no records')
+    posts = []
+    for i in range(count):
+        post = dict(records[i % len(records)])
+        post['id'] = f"{post['id']}-{i // len(records)}"
+        posts.append(post)
+    return posts
+
+
+# Measurement
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def summarize(latencies, items_per_sample, peak_bytes):
+    """Benchmark record from per-sample latencies (seconds)"""
+    total = sum(latencies)
+    return {
+        'samples': len(latencies),
+        'throughput': round(items_per_sample * len(latencies) / total, 1) if total else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4),
+        'peak_kib': round(peak_bytes / 1024, 1)
+    }
+
+
+def traced_peak(fn):
+    """Peak traced allocation of one call to fn"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Pipeline suite
+
+def bench_pipeline(sizes, repeat, corpus=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            posts = load_corpus(corpus, size) if corpus else make_posts(size)
+            path = os.path.join(tmp, f'corpus-{size}.jsonl')
+            write_jsonl(posts, path)
+            replay = JsonlReplaySource(path)
+            runs = itertools.count()
+
+            def ingest():
+                # Fresh database per run, so every run inserts every post
+                db.configure(path=os.path.join(tmp, f'bench-{size}-{next(runs)}.db'))
+                init_db()
+                result = pipeline.analyze(replay, '*', limit=size)
+                assert result['total_posts'] == size, result
+                return result
+
+            def reanalyze():
+                result = pipeline.analyze(DbReplaySource(), '*', limit=size)
+                assert result['total_posts'] == size, result
+                return result
+
+            # db_replay reads back the database of the last ingest run
+            for name, fn in (('ingest', ingest), ('db_replay', reanalyze)):
+                latencies = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    fn()
+                    latencies.append(time.perf_counter() - start)
+                results[f'pipeline.{name}.{size}'] = summarize(latencies, size, traced_peak(fn))
+                print_result(f'pipeline.{name}.{size}', results[f'pipeline.{name}.{size}'], 'posts/s')
+        db.close_all()
+    return results
+
+
+# Helper suite
+
+def sample_arguments(posts):
+    """Argument values by parameter name; list arguments hold 100 items"""
+    batch = posts[:100]
+    texts = [f"{p['title']} {p['selftext']}" for p in batch]
+    post = batch[0]
+    return {
+        'text': texts[0],
+        'texts': texts,
+        'text_list': texts,
+        'posts': batch,
+        'urls': [p['url'] for p in batch],
+        'url': post['url'],
+        'timestamps': [p['created_utc'] for p in batch],
+        'timestamp': post['created_utc'],
+        'created_utc': post['created_utc'],
+        'metrics': [p['score'] for p in batch],
+        'hour_score_pairs': [(int(p['created_utc'] // 3600 % 24), p['score']) for p in batch],
+        'score': post['score'],
+        'num_comments': post['num_comments'],
+        'comments': post['num_comments'],
+        'comment_count': post['num_comments'],
+        'hours_old': 5.0,
+        'is_self': False,
+        'name': 'r/Python',
+        'num': 1234567,
+        'hour': 14,
+        'subscribers': 1000000,
+    }
+
+
+def load_helpers(name_filter=None):
+    """(qualified name, function) for every public helper in HELPER_MODULES"""
+    helpers = []
+    for relpath in HELPER_MODULES:
+        module_name = relpath[:-3].replace('/', '.')
+        spec = importlib.util.spec_from_file_location(f'bench_{module_name.replace(".", "_")}',
+                                                      os.path.join(ROOT, relpath))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        for fn_name, fn in inspect.getmembers(module, inspect.isfunction):
+            if fn.__module__ != module.__name__ or fn_name.startswith('_'):
+                continue
+            qualified = f'{module_name}.{fn_name}'
+            if name_filter and name_filter not in qualified:
+                continue
+            helpers.append((qualified, fn))
+    return helpers
+
+
+def bind_arguments(fn, values):
+    """Positional arguments for fn, or None if a required one has no sample value"""
+    args = []
+    for param in inspect.signature(fn).parameters.values():
+        if param.name in values:
+            args.append(values[param.name])
+        elif param.default is inspect.Parameter.empty:
+            return None
+    return args
+
+
+def bench_helpers(samples, sample_ms, name_filter=None):
+    values = sample_arguments(make_posts(100))
+    results, skipped = {}, {}
+    for name, fn in load_helpers(name_filter):
+        args = bind_arguments(fn, values)
+        if args is None:
+            skipped[name] = 'no sample value for a required argument'
+            continue
+        try:
+            fn(*args)
+        except Exception as e:
+            skipped[name] = f'{type(e).__name__}: {e}'
+            continue
+
+        # Enough calls per sample that timer resolution doesn't matter
+        inner = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(inner):
+                fn(*args)
+            if time.perf_counter() - start >= sample_ms / 1000 or inner >= 1 << 20:
+                break
+            inner *= 2
+
+        latencies = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            for _ in range(inner):
+                fn(*args)
+            latencies.append((time.perf_counter() - start) / inner)
+        results[f'helper.{name}'] = summarize(latencies, 1, traced_peak(lambda: fn(*args)))
+        print_result(f'helper.{name}', results[f'helper.{name}'], 'calls/s')
+    for name, reason in skipped.items():
+        print(f'  skipped {name}: {reason}')
+    return results, skipped
+
+
+# Baseline comparison
+
+def compare(results, baseline, threshold):
+    """Benchmarks worse than baseline by more than threshold (a fraction)"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        checks = (('throughput', current['throughput'] < base['throughput'] * (1 - threshold)),
+                  ('p50_ms', current['p50_ms'] > base['p50_ms'] * (1 + threshold)),
+                  ('p99_ms', current['p99_ms'] > base['p99_ms'] * (1 + threshold)),
+                  ('peak_kib', current['peak_kib'] > base['peak_kib'] * (1 + threshold)))
+        for metric, worse in checks:
+            if worse:
+                regressions.append({'benchmark': name, 'metric': metric,
+                                    'baseline': base[metric], 'current': current[metric]})
+    return regressions
+
+
+def print_result(name, result, unit):
+    print(f"  {name:<55} {result['throughput']:>12,.0f} {unit:<8} "
+          f"p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms  "
+          f"peak {result['peak_kib']:>9,.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', choices=('all', 'pipeline', 'helpers'), default='all')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3, help='pipeline runs per size')
+    parser.add_argument('--samples', type=int, default=50, help='timing samples per helper')
+    parser.add_argument('--sample-ms', type=float, default=2.0,
+                        help='minimum duration of one helper sample')
+    parser.add_argument('--filter', help='only helpers whose name contains this')
+    parser.add_argument('--corpus', help='recorded JSONL fixture instead of synthetic posts')
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to --baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before a benchmark is flagged (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    results, skipped = {}, {}
+    if args.suite in ('all', 'pipeline'):
+        print('Pipeline')
+        results.update(bench_pipeline(args.sizes, args.repeat, args.corpus))
+    if args.suite in ('all', 'helpers'):
+        print('Helpers')
+        helper_results, skipped = bench_helpers(args.samples, args.sample_ms, args.filter)
+        results.update(helper_results)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+        'skipped': skipped
+    }
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'Saved baseline to {args.baseline}')
+        return 0
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        report['baseline'] = args.baseline
+    report['regressions'] = regressions
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f'Wrote {args.out}')
+
+    for r in regressions:
+        print(f"REGRESSION {r['benchmark']} {r['metric']}: {r['baseline']} -> {r['current']}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
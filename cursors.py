@@ -0,0 +1,25 @@
+"""
+Opaque pagination cursors for keyset-paged endpoints (/history, /search).
+
+A cursor is the sort key of the last row on a page, JSON-encoded and then
+URL-safe base64, so clients pass it back without parsing it. Kept apart
+from storage and search so both can import it.
+"""
+
+import base64
+import json
+
+
+def encode_cursor(sort_key, row_id):
+    """Opaque cursor for the row after which the next page starts"""
+    raw = json.dumps([sort_key, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor: (sort key as text, row id); raises ValueError on a malformed cursor"""
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(sort_key), int(row_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
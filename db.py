@@ -0,0 +1,168 @@
+"""
+SQLite connection management for the analytics database.
+Each thread reuses one connection opened in WAL mode, so readers
+never block behind a writer. When the thread exits (or a request ends,
+see release_connection) the connection goes back to a small idle pool
+for the next thread instead of being closed.
+"""
+
+import os
+import sqlite3
+import threading
+import weakref
+
+import instrumentation
+
+# Database location, overridable with the ANALYTICS_DB environment variable
+DB_PATH = os.environ.get('ANALYTICS_DB', 'analytics.db')
+
+# Pragmas applied to every new connection
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',    # safe with WAL, fsyncs only at checkpoints
+    'cache_size': -64000,       # negative means KiB, so ~64 MB page cache
+    'mmap_size': 268435456,     # 256 MB of memory-mapped reads
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,       # wait up to 5s for a write lock instead of failing
+}
+
+# Ids per IN (...) lookup in select_in, below SQLite's bound-variable limit
+LOOKUP_CHUNK_SIZE = 500
+
+# Idle connections kept for reuse by new threads; any beyond this are closed
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+_local = threading.local()
+_lock = threading.RLock()     # finalizers may run while this thread holds it
+_idle = []                      # released connections of the current generation
+_holders = weakref.WeakSet()    # live threads' connections, dropped as threads exit
+_generation = 0
+_opened = 0
+
+
+class _Holder:
+    """A thread's connection; when the thread exits its local storage is
+    dropped and the finalizer hands the connection back to the pool"""
+
+    __slots__ = ('conn', 'generation', 'finalizer', '__weakref__')
+
+    def __init__(self, conn, generation):
+        self.conn = conn
+        self.generation = generation
+        self.finalizer = weakref.finalize(self, _release, conn, generation)
+
+
+def configure(path=None, **pragmas):
+    """Change the database path and/or pragmas.
+
+    Open connections are closed; each thread reconnects on its next
+    get_connection() call.
+    """
+    global DB_PATH, _generation
+    with _lock:
+        if path is not None:
+            DB_PATH = path
+        PRAGMAS.update(pragmas)
+        _generation += 1
+    close_all()
+
+
+def connect(path=None):
+    """Open a new connection with the configured pragmas applied"""
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False,
+                           factory=instrumentation.connection_factory())
+    for name, value in PRAGMAS.items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def begin_immediate(conn):
+    """Start conn's transaction now, holding SQLite's write lock until it commits
+
+    sqlite3 only begins a transaction at the first INSERT/UPDATE, so reads
+    made before that (e.g. diffing against stored rows) can race another
+    writer. Call it first thing inside `with conn:`.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+
+
+def select_in(conn, sql, ids, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Rows of sql for a list of ids, queried in chunks
+
+    sql marks where the id list goes with {ids}, e.g.
+    'SELECT id, score FROM reddit_posts WHERE id IN ({ids})'.
+    """
+    rows = []
+    for i in range(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        rows.extend(conn.execute(sql.format(ids=', '.join('?' * len(chunk))), chunk))
+    return rows
+
+
+def get_connection():
+    """Return this thread's connection, taking an idle one or opening it on first use"""
+    global _opened
+    holder = getattr(_local, 'holder', None)
+    if holder is not None:
+        if holder.generation == _generation:
+            return holder.conn
+        release_connection()
+
+    with _lock:
+        conn = _idle.pop() if _idle else None
+        generation = _generation
+    if conn is None:
+        conn = connect()
+        with _lock:
+            _opened += 1
+    holder = _Holder(conn, generation)
+    with _lock:
+        _holders.add(holder)
+    _local.holder = holder
+    return conn
+
+
+def release_connection():
+    """Give this thread's connection back to the idle pool (closed if the pool is full)"""
+    holder = getattr(_local, 'holder', None)
+    if holder is not None:
+        del _local.holder
+        holder.finalizer()
+
+
+def _release(conn, generation):
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        generation = None
+    with _lock:
+        if generation == _generation and len(_idle) < DB_POOL_SIZE:
+            _idle.append(conn)
+            return
+    _close(conn)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def close_all():
+    """Close every open connection; threads reconnect on their next get_connection()"""
+    global _generation
+    with _lock:
+        _generation += 1
+        conns = _idle + [holder.conn for holder in list(_holders)]
+        _idle.clear()
+    for conn in conns:
+        _close(conn)
+
+
+def stats():
+    with _lock:
+        return {'in_use': len(_holders), 'idle': len(_idle), 'opened': _opened,
+                'pool_size': DB_POOL_SIZE}
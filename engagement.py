@@ -0,0 +1,128 @@
+"""
+Vectorized engagement metrics over whole batches of posts.
+Each metric matches its per-post helper in app.py / utils/analytics.py but
+is computed for every post in one NumPy pass against a single reference
+timestamp.
+"""
+
+import time
+
+import numpy as np
+
+import db
+
+# Youngest age used for per-hour rates, so brand new posts don't spike
+MIN_AGE_HOURS = 0.1
+
+METRICS = ('velocity', 'trending', 'hot', 'controversy', 'engagement_ratio', 'engagement_rate')
+
+
+def engagement_metrics(scores, num_comments, created_utc, now=None, subscribers=None):
+    """Compute every metric for arrays of scores, comment counts and timestamps
+
+    Returns a dict of float64 arrays:
+      velocity          score per hour (calculate_post_velocity)
+      trending          (score + 2*comments) / (age + 2)^1.5 (calculate_trending_score)
+      hot               (score + 2*comments) / (age + 2)^1.8 (calculate_hot_score)
+      controversy       10 * comments / score, or comments when score <= 0
+                        (calculate_controversy_score)
+      engagement_ratio  comments / max(score, 1) (calculate_engagement_ratio)
+      engagement_rate   (score + comments) as % of subscribers, only when
+                        subscribers is given (calculate_engagement_rate)
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    comments = np.asarray(num_comments, dtype=np.float64)
+    created = np.asarray(created_utc, dtype=np.float64)
+    now = time.time() if now is None else now
+
+    age_hours = np.maximum(now - created, 0) / 3600
+    weighted = scores + 2 * comments
+    positive = scores > 0
+
+    result = {
+        'age_hours': age_hours,
+        'velocity': scores / np.maximum(age_hours, MIN_AGE_HOURS),
+        'trending': weighted / (np.maximum(age_hours, MIN_AGE_HOURS) + 2) ** 1.5,
+        'hot': weighted / (age_hours + 2) ** 1.8,
+        'controversy': np.where(positive, 10 * comments / np.where(positive, scores, 1), comments),
+        'engagement_ratio': comments / np.maximum(scores, 1),
+    }
+    if subscribers:
+        result['engagement_rate'] = (scores + comments) / subscribers * 100
+    return result
+
+
+def top_k(values, k=10):
+    """Indices of the k largest values, largest first"""
+    values = np.asarray(values)
+    if k >= len(values):
+        return np.argsort(values)[::-1]
+    idx = np.argpartition(values, -k)[-k:]
+    return idx[np.argsort(values[idx])[::-1]]
+
+
+def find_outliers(values, factor=3.0, z=None):
+    """Indices of viral outliers
+
+    By default a value is an outlier when it exceeds `factor` times the mean
+    (identify_viral_outliers); pass z to use a z-score threshold instead.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return np.array([], dtype=np.intp)
+    if z is not None:
+        std = values.std()
+        if std == 0:
+            return np.array([], dtype=np.intp)
+        return np.flatnonzero((values - values.mean()) / std > z)
+    return np.flatnonzero(values > values.mean() * factor)
+
+
+def load_post_arrays(subreddit=None, since_utc=None):
+    """Read stored posts into column arrays: ids, scores, comments, created_utc"""
+    sql = 'SELECT id, score, num_comments, created_utc FROM reddit_posts'
+    clauses, params = [], []
+    if subreddit:
+        clauses.append('subreddit = ? COLLATE NOCASE')
+        params.append(subreddit)
+    if since_utc:
+        clauses.append('created_utc >= ?')
+        params.append(since_utc)
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+
+    rows = db.get_connection().execute(sql, params).fetchall()
+    if not rows:
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=object), empty, empty, empty
+    ids, scores, comments, created = zip(*rows)
+    return (np.array(ids, dtype=object),
+            np.array(scores, dtype=np.float64),
+            np.array(comments, dtype=np.float64),
+            np.array(created, dtype=np.float64))
+
+
+def rank_stored_posts(metric='hot', subreddit=None, limit=20, factor=3.0, now=None):
+    """Rank stored posts by a metric and flag outliers on it"""
+    if metric not in METRICS or metric == 'engagement_rate':
+        raise ValueError(f'Unknown metric: {metric}')
+
+    start = time.perf_counter()
+    ids, scores, comments, created = load_post_arrays(subreddit)
+    loaded = time.perf_counter()
+
+    values = engagement_metrics(scores, comments, created, now=now)[metric]
+    best = top_k(values, limit)
+    outliers = find_outliers(values, factor=factor)
+    done = time.perf_counter()
+
+    return {
+        'metric': metric,
+        'total_posts': len(ids),
+        'top': [{'id': ids[i], 'score': int(scores[i]), 'num_comments': int(comments[i]),
+                 metric: round(float(values[i]), 4)} for i in best],
+        'outliers': [ids[i] for i in outliers[:limit]],
+        'outlier_count': len(outliers),
+        'load_ms': round((loaded - start) * 1000, 2),
+        'compute_ms': round((done - loaded) * 1000, 2)
+    }
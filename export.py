@@ -0,0 +1,310 @@
+"""
+Columnar export of stored posts for offline analytics.
+
+reddit_posts, joined with each post's current derived features, is
+streamed into Parquet (or Arrow IPC) files partitioned Hive-style by
+subreddit and UTC creation date:
+
+    exports/subreddit=python/date=2024-05-01/part-20240502T101500.parquet
+
+Rows are read in created order per subreddit, so each partition's rows
+arrive together and only one file is open at a time; at most chunk_size
+rows are held in memory. _export.json in the output directory records a
+watermark per subreddit exported (and '*' for all of them): the newest
+fetched_at written. An incremental export writes only posts stored or
+refreshed since then, as new part files next to the old ones. It reaches
+back EXPORT_WATERMARK_LAG seconds before the watermark, since a save that
+started earlier may have committed after the previous export read the
+table. A post exported more than once has a copy in several parts; the one
+with the latest fetched_at is current.
+
+    python export.py --out exports                 # everything
+    python export.py --out exports --incremental   # changes since the last run
+
+The files load back in through ArrowReplaySource (the 'replay' source when
+REPLAY_PATH is an export directory). Needs pyarrow.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import db
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', 'exports')
+
+# Rows per row group / record batch, and the most rows held in memory
+EXPORT_CHUNK_SIZE = 50000
+
+# How far incremental exports re-read before the watermark
+EXPORT_WATERMARK_LAG = int(os.environ.get('EXPORT_WATERMARK_LAG', 60))
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+MANIFEST_NAME = '_export.json'
+
+# Exports share the manifest, so they run one at a time
+_export_lock = threading.Lock()
+
+POST_COLUMNS = ('id', 'title', 'author', 'score', 'num_comments', 'created_utc', 'url',
+                'selftext', 'fetched_at')
+FEATURE_COLUMNS = ('sentiment', 'sentiment_label', 'clickbait', 'content_type', 'velocity',
+                   'controversy', 'engagement_ratio')
+
+# Features are only exported while they match the post's current counts
+EXPORT_SQL = f'''SELECT lower(p.subreddit), {", ".join("p." + c for c in POST_COLUMNS)},
+                        {", ".join("f." + c for c in FEATURE_COLUMNS)}
+                 FROM reddit_posts p
+                 LEFT JOIN post_features f
+                   ON f.post_id = p.id AND f.score = p.score AND f.num_comments = p.num_comments'''
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError('Exports need pyarrow (pip install pyarrow)') from e
+    return pyarrow
+
+
+def schema():
+    """Arrow schema of the exported files (subreddit and date live in the path)"""
+    pa = require_pyarrow()
+    return pa.schema([
+        ('id', pa.string()),
+        ('title', pa.string()),
+        ('author', pa.string()),
+        ('score', pa.int64()),
+        ('num_comments', pa.int64()),
+        ('created_utc', pa.float64()),
+        ('url', pa.string()),
+        ('selftext', pa.string()),
+        ('fetched_at', pa.timestamp('us')),
+        ('sentiment', pa.float64()),
+        ('sentiment_label', pa.string()),
+        ('clickbait', pa.float64()),
+        ('content_type', pa.string()),
+        ('velocity', pa.float64()),
+        ('controversy', pa.float64()),
+        ('engagement_ratio', pa.float64()),
+    ])
+
+
+def utc_date(created_utc):
+    """Partition date of a post: its UTC creation day"""
+    return datetime.fromtimestamp(int(created_utc or 0), timezone.utc).strftime('%Y-%m-%d')
+
+
+def load_manifest(out_dir):
+    """The export directory's manifest, or an empty one"""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'watermarks': {}, 'runs': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+class _PartitionWriter:
+    """Writes one partition file at a time, switching as the partition changes"""
+
+    def __init__(self, out_dir, fmt, run_id, arrow_schema):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.run_id = run_id
+        self.schema = arrow_schema
+        self.partition = None
+        self.files = []
+        self._writer = None
+
+    def write(self, partition, columns):
+        pa = require_pyarrow()
+        if partition != self.partition:
+            self.close()
+            subreddit, date = partition
+            directory = os.path.join(self.out_dir, f'subreddit={subreddit}', f'date={date}')
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'part-{self.run_id}{FORMATS[self.fmt]}')
+            if self.fmt == 'parquet':
+                self._writer = pa.parquet.ParquetWriter(path, self.schema, compression='zstd')
+            else:
+                self._writer = pa.ipc.new_file(path, self.schema)
+            self.partition = partition
+            self.files.append(os.path.relpath(path, self.out_dir))
+        columns['fetched_at'] = pa.array(columns['fetched_at'], pa.string()).cast(
+            pa.timestamp('us'))
+        self._writer.write_table(pa.table(columns, schema=self.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.partition = None
+
+
+def partitions(out_dir, subreddit=None):
+    """(subreddit, date, files) for each partition under out_dir, in path order
+
+    subreddit limits the listing to that subreddit's partitions; None or
+    '*' lists them all.
+    """
+    wanted = None if subreddit in (None, '*') else f'subreddit={subreddit.lower()}'
+    for sub_dir in sorted(os.listdir(out_dir)):
+        if not sub_dir.startswith('subreddit=') or (wanted and sub_dir != wanted):
+            continue
+        for date_dir in sorted(os.listdir(os.path.join(out_dir, sub_dir))):
+            if not date_dir.startswith('date='):
+                continue
+            directory = os.path.join(out_dir, sub_dir, date_dir)
+            files = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                     if name.startswith('part-') and name.endswith(tuple(FORMATS.values()))]
+            if files:
+                yield sub_dir[len('subreddit='):], date_dir[len('date='):], files
+
+
+def read_partition(files):
+    """One partition's rows as an Arrow table, latest copy of each post only"""
+    pa = require_pyarrow()
+    tables = []
+    for path in files:
+        if path.endswith(FORMATS['parquet']):
+            tables.append(pa.parquet.read_table(path, schema=schema()))
+        else:
+            with pa.OSFile(path) as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+    table = pa.concat_tables(tables).sort_by([('fetched_at', 'descending')])
+    # A post refreshed between exports has a copy in each run's part file
+    seen, keep = set(), []
+    for i, post_id in enumerate(table.column('id').to_pylist()):
+        if post_id not in seen:
+            seen.add(post_id)
+            keep.append(i)
+    if len(keep) < table.num_rows:
+        table = table.take(keep)
+    return table
+
+
+def export_posts(out_dir=EXPORT_DIR, fmt='parquet', subreddit=None, since=None,
+                 incremental=False, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Stream stored posts into partitioned Parquet / Arrow IPC files under out_dir
+
+    since limits the export to posts fetched after that time (a datetime or
+    the 'YYYY-MM-DD HH:MM:SS' text stored in fetched_at); incremental=True
+    starts from the watermark left by previous exports instead. progress, if
+    given, is told about each chunk written (see jobs.Job).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}; use one of {", ".join(FORMATS)}')
+    with _export_lock:
+        return _export(out_dir, fmt, subreddit, since, incremental, chunk_size, progress)
+
+
+def _export(out_dir, fmt, subreddit, since, incremental, chunk_size, progress):
+    arrow_schema = schema()
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    scope = subreddit.lower() if subreddit else '*'
+    previous = max(filter(None, (manifest['watermarks'].get(scope),
+                                 manifest['watermarks'].get('*'))), default=None)
+    if incremental and since is None and previous is not None:
+        since = str(datetime.fromisoformat(previous) - timedelta(seconds=EXPORT_WATERMARK_LAG))
+    # A run starting after the watermark leaves a gap, so it can't move it
+    covered = since is None or (previous is not None and str(since) <= previous)
+
+    clauses, params = [], []
+    if since is not None:
+        clauses.append('p.fetched_at > ?')
+        params.append(str(since))
+    if subreddit:
+        clauses.append('p.subreddit = ? COLLATE NOCASE')
+        params.append(subreddit)
+    sql = EXPORT_SQL
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY p.subreddit COLLATE NOCASE, p.created_utc'
+
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    writer = _PartitionWriter(out_dir, fmt, run_id, arrow_schema)
+    names = POST_COLUMNS + FEATURE_COLUMNS
+    rows_written, watermark = 0, previous
+
+    # A dedicated connection reading one snapshot; sorts spill to disk, not memory
+    conn = db.connect()
+    conn.execute('PRAGMA temp_store=FILE')
+    if progress is not None:
+        progress.set_stage('exporting')
+    try:
+        cursor = conn.execute(sql, params)
+        partition, buffer = None, []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            for row in rows:
+                key = (row[0] or '', utc_date(row[6]))
+                if key != partition or len(buffer) >= chunk_size:
+                    if buffer:
+                        writer.write(partition, dict(zip(names, map(list, zip(*buffer)))))
+                    partition, buffer = key, []
+                buffer.append(row[1:])
+                fetched_at = row[9]
+                if fetched_at is not None and (watermark is None or str(fetched_at) > watermark):
+                    watermark = str(fetched_at)
+            rows_written += len(rows)
+            if progress is not None:
+                progress.advance(len(rows))
+            if not rows:
+                break
+        if buffer:
+            writer.write(partition, dict(zip(names, map(list, zip(*buffer)))))
+    finally:
+        writer.close()
+        conn.close()
+
+    result = {
+        'run_id': run_id,
+        'format': fmt,
+        'since': str(since) if since is not None else None,
+        'rows_written': rows_written,
+        'files': writer.files,
+        'watermark': watermark,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    }
+    if covered and watermark is not None:
+        manifest['watermarks'][scope] = watermark
+    manifest['runs'].append({key: value for key, value in result.items() if key != 'files'})
+    _save_manifest(out_dir, manifest)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export stored posts to Parquet / Arrow IPC')
+    parser.add_argument('--out', default=EXPORT_DIR)
+    parser.add_argument('--format', default='parquet', choices=tuple(FORMATS))
+    parser.add_argument('--subreddit')
+    parser.add_argument('--since', help="only posts fetched after this time, e.g. '2024-05-01'")
+    parser.add_argument('--incremental', action='store_true',
+                        help='only posts fetched since the previous export to --out')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from storage import init_db
+    init_db()
+    result = export_posts(args.out, args.format, args.subreddit, args.since, args.incremental,
+                          args.chunk_size)
+    print(f"Exported {result['rows_written']} posts into {len(result['files'])} files "
+          f"in {result['elapsed_ms']} ms (watermark {result['watermark']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Per-post derived features, computed once at ingest and stored in post_features.
+
+Each row keeps the score and num_comments it was computed from, so a row
+is stale as soon as the post's counts change; current_post_features only
+exposes rows that still match their post. Dashboards aggregate these
+columns in SQL instead of re-running the helpers over raw text.
+
+Fill in rows for posts stored before this table existed (or gone stale):
+    python features.py backfill
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import db
+from engagement import engagement_metrics
+from sentiment import engine as sentiment_engine, label_for
+from utils import get_content_type
+
+FEATURE_COLUMNS = ('post_id', 'score', 'num_comments', 'sentiment', 'sentiment_label',
+                   'clickbait', 'content_type', 'velocity', 'controversy',
+                   'engagement_ratio', 'computed_at')
+
+UPSERT_FEATURES_SQL = f'''INSERT OR REPLACE INTO post_features
+                          ({", ".join(FEATURE_COLUMNS)})
+                          VALUES ({", ".join("?" * len(FEATURE_COLUMNS))})'''
+
+# Rows computed and written per transaction by backfill
+BACKFILL_BATCH_SIZE = 1000
+
+
+def init_features_schema(conn):
+    """Create post_features and the current_post_features view"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS post_features
+                    (post_id TEXT PRIMARY KEY,
+                     score INTEGER,
+                     num_comments INTEGER,
+                     sentiment REAL,
+                     sentiment_label TEXT,
+                     clickbait REAL,
+                     content_type TEXT,
+                     velocity REAL,
+                     controversy REAL,
+                     engagement_ratio REAL,
+                     computed_at REAL)''')
+    # Features whose snapshot still matches the stored post
+    conn.execute('''CREATE VIEW IF NOT EXISTS current_post_features AS
+                    SELECT f.*, p.subreddit, p.created_utc
+                    FROM post_features f JOIN reddit_posts p ON p.id = f.post_id
+                    WHERE f.score = p.score AND f.num_comments = p.num_comments''')
+
+
+def _load_utils_analytics():
+    """utils/analytics.py, which `import utils` can't reach past utils.py"""
+    module = sys.modules.get('utils_analytics')
+    if module is None:
+        spec = importlib.util.spec_from_file_location(
+            'utils_analytics', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            'utils', 'analytics.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['utils_analytics'] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+clickbait_score = _load_utils_analytics().calculate_clickbait_score
+
+
+def _is_self(post):
+    return bool(post['selftext']) or '/comments/' in (post['url'] or '')
+
+
+def compute_features(posts, now=None):
+    """Feature rows (in FEATURE_COLUMNS order) for a list of post records
+
+    Engagement metrics are computed for the whole list in one NumPy pass;
+    velocity is relative to `now`, which is stored as computed_at.
+    """
+    if not posts:
+        return []
+    now = time.time() if now is None else now
+    metrics = engagement_metrics([p['score'] for p in posts],
+                                 [p['num_comments'] for p in posts],
+                                 [p['created_utc'] for p in posts], now=now)
+    sentiments = sentiment_engine.score_batch(f"{p['title']} {p['selftext'] or ''}" for p in posts)
+
+    rows = []
+    for i, post in enumerate(posts):
+        score, count = sentiments[i]
+        rows.append((post['id'], post['score'], post['num_comments'],
+                     round(score / count, 4) if count else 0.0, label_for(score),
+                     clickbait_score(post['title']),
+                     get_content_type(post['url'] or '', _is_self(post)),
+                     round(float(metrics['velocity'][i]), 2),
+                     round(float(metrics['controversy'][i]), 2),
+                     round(float(metrics['engagement_ratio'][i]), 4),
+                     now))
+    return rows
+
+
+def save_features(conn, posts, now=None):
+    """Compute and write features for posts on conn; the caller commits"""
+    rows = compute_features(posts, now)
+    conn.executemany(UPSERT_FEATURES_SQL, rows)
+    return len(rows)
+
+
+POST_COLUMNS = ('id', 'score', 'num_comments', 'created_utc', 'title', 'selftext', 'url')
+
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE, full=False):
+    """Compute features for stored posts that have none or stale ones
+
+    With full=True every post is recomputed. Returns the number of rows
+    written and the time spent in milliseconds.
+    """
+    start = time.perf_counter()
+    conn = db.get_connection()
+    sql = (f'SELECT {", ".join("p." + c for c in POST_COLUMNS)} FROM reddit_posts p '
+           'LEFT JOIN post_features f ON f.post_id = p.id WHERE p.id > ?')
+    if not full:
+        sql += (' AND (f.post_id IS NULL OR f.score IS NOT p.score'
+                ' OR f.num_comments IS NOT p.num_comments)')
+    sql += ' ORDER BY p.id LIMIT ?'
+
+    written = 0
+    last_id = ''
+    while True:
+        posts = [dict(zip(POST_COLUMNS, row))
+                 for row in conn.execute(sql, (last_id, batch_size)).fetchall()]
+        if not posts:
+            break
+        with conn:
+            written += save_features(conn, posts)
+        last_id = posts[-1]['id']
+
+    return {'rows_written': written,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def feature_summary(subreddit=None):
+    """Aggregate current features in SQL, optionally for one subreddit"""
+    where, params = '', []
+    if subreddit:
+        where, params = ' WHERE subreddit = ? COLLATE NOCASE', [subreddit]
+    conn = db.get_connection()
+
+    totals = conn.execute('SELECT COUNT(*), AVG(sentiment), AVG(clickbait), AVG(velocity), '
+                          'AVG(controversy), AVG(engagement_ratio) '
+                          f'FROM current_post_features{where}', params).fetchone()
+    labels = conn.execute('SELECT sentiment_label, COUNT(*) FROM current_post_features'
+                          f'{where} GROUP BY sentiment_label', params).fetchall()
+    content_types = conn.execute('SELECT content_type, COUNT(*) FROM current_post_features'
+                                 f'{where} GROUP BY content_type', params).fetchall()
+
+    def avg(value, digits=4):
+        return round(value, digits) if value is not None else 0
+
+    return {
+        'total_posts': totals[0],
+        'avg_sentiment': avg(totals[1]),
+        'avg_clickbait': avg(totals[2]),
+        'avg_velocity': avg(totals[3], 2),
+        'avg_controversy': avg(totals[4], 2),
+        'avg_engagement_ratio': avg(totals[5]),
+        'sentiment': dict(labels),
+        'content_types': dict(content_types)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the post_features table')
+    sub = parser.add_subparsers(dest='command', required=True)
+    fill = sub.add_parser('backfill', help='compute features for posts missing them or gone stale')
+    fill.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    fill.add_argument('--full', action='store_true', help='recompute every post')
+    args = parser.parse_args()
+
+    from storage import init_db
+    init_db()
+    result = backfill(args.batch_size, args.full)
+    print(f"Wrote features for {result['rows_written']} posts in {result['elapsed_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Background ingestion of a fixed list of subreddits.
+Each subreddit is polled on its own interval (with jitter, so polls don't
+line up) through the incremental pipeline, which writes new posts through
+the persistence layer and updates the subreddit's stored aggregate. Failed
+polls back off exponentially. /analyze can then answer from the stored
+aggregate instead of fetching during the request.
+
+Configure with INGEST_SUBREDDITS, e.g. "python:300,rust:900,golang"
+(seconds; entries without one use INGEST_INTERVAL). Run as its own process:
+    python ingest.py            (or: flask --app app ingest)
+or inside the web app, started by `python app.py` or by serving
+app:create_app() from a WSGI server.
+
+The clock, sleep and random source are injectable, so the scheduler can be
+driven step by step with run_pending(now).
+"""
+
+import heapq
+import os
+import random
+import threading
+import time
+
+import pipeline
+from sources import get_source
+
+INGEST_SUBREDDITS = os.environ.get('INGEST_SUBREDDITS', '')
+INGEST_INTERVAL = float(os.environ.get('INGEST_INTERVAL', 300))
+INGEST_SOURCE = os.environ.get('INGEST_SOURCE', 'reddit')
+INGEST_LIMIT = int(os.environ.get('INGEST_LIMIT', 100))
+
+# Fraction of the interval added or taken off each poll at random
+DEFAULT_JITTER = 0.1
+# Longest wait between retries of a failing subreddit
+DEFAULT_MAX_BACKOFF = 3600.0
+
+
+def parse_subreddits(spec, default_interval=INGEST_INTERVAL):
+    """Parse "name:seconds,name,..." into {name: interval}"""
+    subreddits = {}
+    for entry in spec.split(','):
+        name, _, interval = entry.strip().partition(':')
+        if name:
+            subreddits[name] = float(interval) if interval else default_interval
+    return subreddits
+
+
+class IngestScheduler:
+    """Polls subreddits on their intervals and ingests new posts
+
+    subreddits maps a name to its poll interval in seconds. ingest(name)
+    does one poll (pipeline.analyze_incremental by default) and may raise.
+    """
+
+    def __init__(self, source, subreddits, limit=INGEST_LIMIT, jitter=DEFAULT_JITTER,
+                 max_backoff=DEFAULT_MAX_BACKOFF, clock=time.monotonic, rng=None, ingest=None):
+        self.source = source
+        self.intervals = dict(subreddits)
+        self.limit = limit
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.ingest = ingest or self._ingest
+        self.status = {name: {'runs': 0, 'failures': 0, 'consecutive_failures': 0,
+                              'new_posts': 0, 'truncated': 0, 'last_success': None,
+                              'last_error': None,
+                              'next_run': None}
+                       for name in self.intervals}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Min-heap of (due, name); everything is due right away, spread over the jitter
+        now = self.clock()
+        self._queue = []
+        for name, interval in self.intervals.items():
+            self._schedule(name, now + self.rng.uniform(0, interval * self.jitter))
+
+    def _ingest(self, name):
+        return pipeline.analyze_incremental(self.source, name, self.limit)
+
+    def _schedule(self, name, due):
+        self.status[name]['next_run'] = due
+        heapq.heappush(self._queue, (due, name))
+
+    def _delay(self, name):
+        """Seconds until the next poll: the interval, or a backoff after failures"""
+        interval = self.intervals[name]
+        failures = self.status[name]['consecutive_failures']
+        if failures:
+            interval = min(interval * 2 ** failures, max(self.max_backoff, interval))
+        return interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def next_due(self):
+        """Time of the next scheduled poll, or None with nothing scheduled"""
+        with self._lock:
+            return self._queue[0][0] if self._queue else None
+
+    def run_pending(self, now=None):
+        """Poll every subreddit that is due at `now`; returns the names polled"""
+        now = self.clock() if now is None else now
+        polled = []
+        while True:
+            with self._lock:
+                if not self._queue or self._queue[0][0] > now:
+                    break
+                _, name = heapq.heappop(self._queue)
+            self._poll(name, now)
+            polled.append(name)
+        return polled
+
+    def _poll(self, name, now):
+        status = self.status[name]
+        status['runs'] += 1
+        try:
+            result = self.ingest(name)
+            if isinstance(result, dict) and result.get('success') is False:
+                raise RuntimeError(result.get('error') or 'ingest failed')
+        except Exception as e:
+            status['failures'] += 1
+            status['consecutive_failures'] += 1
+            status['last_error'] = str(e)
+        else:
+            status['consecutive_failures'] = 0
+            status['last_success'] = now
+            status['last_error'] = None
+            if isinstance(result, dict):
+                status['new_posts'] += result.get('new_posts', 0)
+                # More posts arrived than one poll can page back through
+                status['truncated'] += bool(result.get('truncated'))
+        with self._lock:
+            self._schedule(name, now + self._delay(name))
+
+    def run_forever(self, sleep=None, max_sleep=60.0):
+        """Poll until stop() is called, sleeping until the next poll is due"""
+        sleep = sleep or self._stop.wait
+        while not self._stop.is_set():
+            self.run_pending()
+            due = self.next_due()
+            wait = max_sleep if due is None else min(max(due - self.clock(), 0), max_sleep)
+            sleep(wait)
+
+    def start(self):
+        """Run the scheduler on a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='ingest', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Per-subreddit run counters, last error and next poll time"""
+        now = self.clock()
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'source': self.source.name,
+            'subreddits': {name: dict(status, interval=self.intervals[name],
+                                      next_run_in=round(status['next_run'] - now, 2))
+                           for name, status in self.status.items()}
+        }
+
+
+def from_env():
+    """Scheduler for INGEST_SUBREDDITS, or None if it isn't set"""
+    subreddits = parse_subreddits(INGEST_SUBREDDITS)
+    if not subreddits:
+        return None
+    source = get_source(INGEST_SOURCE)
+    if source is None:
+        raise ValueError(f'Unknown INGEST_SOURCE {INGEST_SOURCE!r}')
+    return IngestScheduler(source, subreddits)
+
+
+def main():
+    from storage import init_db
+    init_db()
+    scheduler = from_env()
+    if scheduler is None:
+        raise SystemExit('Set INGEST_SUBREDDITS, e.g. "python:300,rust:900"')
+    print(f"Ingesting {', '.join(scheduler.intervals)} from {scheduler.source.name}")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Lightweight timing instrumentation, exported in Prometheus text format.
+
+Pipeline stages, SQLite statements and HTTP requests are timed into
+histograms; other components (caches, job pool, rate limiter) register
+collectors that report gauges at scrape time. Set INSTRUMENTATION=0 to turn
+it all off: stages are then not wrapped, connections are plain sqlite3
+connections, and the only remaining cost is a flag check per request.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Set to '0' to disable all timing
+enabled = os.environ.get('INSTRUMENTATION', '1') != '0'
+
+# Histogram upper bounds in seconds
+DURATION_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{name}="{str(value)}"' for name, value in pairs)
+    return '{' + body + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def totals(self):
+        """{label values: (sum, count)}"""
+        with self._lock:
+            return {labels: (series[1], series[2]) for labels, series in self._series.items()}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, label_values, ('le', bound))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labels, label_values, ('le', '+Inf'))
+                lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {round(total, 6)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Metrics and gauge collectors rendered together by /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_gauges(self, prefix, help, stats_fn):
+        """Export the numeric values of stats_fn() as gauges named prefix_<key>"""
+        self.collectors.append((prefix, help, stats_fn))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, help, stats_fn in self.collectors:
+            for key, value in sorted(stats_fn().items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{prefix}_{key}'
+                lines.extend((f'# HELP {name} {help}: {key}', f'# TYPE {name} gauge',
+                              f'{name} {value}'))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram('analyze_stage_seconds',
+                                   'Exclusive time per analysis pipeline stage', ('stage',))
+DB_QUERY_SECONDS = registry.histogram('db_query_seconds',
+                                      'SQLite statement and row fetch time', ('op',))
+HTTP_REQUEST_SECONDS = registry.histogram('http_request_seconds',
+                                          'Time to produce a response', ('endpoint',))
+HTTP_REQUESTS = registry.counter('http_requests_total', 'Responses by endpoint and status',
+                                 ('endpoint', 'status'))
+
+
+class StageTimer:
+    """Exclusive time per stage of one pipeline run
+
+    Stages are generators chained in order; wrap() times how long each
+    next() on a stage takes, which includes its upstream stages, and the
+    upstream share is subtracted afterwards.
+    """
+
+    def __init__(self):
+        self.order = []
+        self.inclusive = {}
+
+    def wrap(self, stage, iterable):
+        self.order.append(stage)
+        self.inclusive[stage] = 0.0
+        return self._timed(stage, iter(iterable))
+
+    def _timed(self, stage, iterator):
+        clock = time.perf_counter
+        total = 0.0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    total += clock() - start
+                    return
+                total += clock() - start
+                yield item
+        finally:
+            self.inclusive[stage] += total
+
+    def stages(self):
+        """{stage: exclusive seconds}"""
+        exclusive, upstream = {}, 0.0
+        for stage in self.order:
+            exclusive[stage] = max(self.inclusive[stage] - upstream, 0.0)
+            upstream = self.inclusive[stage]
+        return exclusive
+
+    def observe(self):
+        """Record this run's stage times in STAGE_SECONDS"""
+        for stage, seconds in self.stages().items():
+            STAGE_SECONDS.observe(seconds, stage)
+
+
+def observe_stage(stage, seconds):
+    if enabled:
+        STAGE_SECONDS.observe(seconds, stage)
+
+
+# Per-thread SQLite totals, so a request can report its own query time
+_local = threading.local()
+
+
+def _observe_query(sql, seconds):
+    words = sql.split(None, 1)
+    DB_QUERY_SECONDS.observe(seconds, words[0].lower() if words else 'other')
+    _local.count = getattr(_local, 'count', 0) + 1
+    _local.seconds = getattr(_local, 'seconds', 0.0) + seconds
+
+
+def thread_db_totals():
+    """(statements, seconds) the current thread has run, row fetches included"""
+    return getattr(_local, 'count', 0), getattr(_local, 'seconds', 0.0)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """sqlite3 cursor whose statements and row fetches are timed
+
+    Each statement is observed under its type. Stepping through its rows
+    (fetch* calls and iteration) is added up and observed once under 'fetch'
+    when the rows run out or the cursor runs another statement or closes.
+    """
+
+    _fetch_seconds = 0.0
+
+    def execute(self, sql, parameters=()):
+        self._flush_fetch()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        self._flush_fetch()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            _observe_query(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, True)
+        return rows
+
+    def __next__(self):
+        start, done = time.perf_counter(), False
+        try:
+            return super().__next__()
+        except StopIteration:
+            done = True
+            raise
+        finally:
+            self._fetched(start, done)
+
+    def close(self):
+        self._flush_fetch()
+        super().close()
+
+    def __del__(self):
+        self._flush_fetch()
+
+    def _fetched(self, start, done):
+        seconds = time.perf_counter() - start
+        _local.seconds = getattr(_local, 'seconds', 0.0) + seconds
+        self._fetch_seconds += seconds
+        if done:
+            self._flush_fetch()
+
+    def _flush_fetch(self):
+        if self._fetch_seconds:
+            DB_QUERY_SECONDS.observe(self._fetch_seconds, 'fetch')
+            self._fetch_seconds = 0.0
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors are TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # sqlite3's own shortcuts skip an overridden cursor(), so go through it
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+
+def connection_factory():
+    """sqlite3 connection class to use for new connections"""
+    return TimedConnection if enabled else sqlite3.Connection
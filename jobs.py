@@ -0,0 +1,120 @@
+"""
+Background jobs for long analyses.
+A job runs on a bounded worker pool instead of a Flask request thread and
+reports its progress (stage, posts processed, ETA) while it runs. Finished
+jobs are kept in a TTL cache so clients can pick up the result later.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+
+JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 4))
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 600))
+JOB_RESULT_SIZE = int(os.environ.get('JOB_RESULT_SIZE', 256))
+
+
+class Job:
+    """State of one job; also the progress object handed to the pipeline"""
+
+    def __init__(self, total=None, clock=time.monotonic):
+        self.id = uuid.uuid4().hex
+        self.clock = clock
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.total = total
+        self.processed = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self._started = None
+        self._finished = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+    def advance(self, count=1):
+        self.processed += count
+
+    def eta_seconds(self):
+        """Seconds left at the current rate, if there is a rate and a total to go by"""
+        if self.status != 'running' or not self.total or not self.processed:
+            return None
+        elapsed = self.clock() - self._started
+        remaining = max(self.total - self.processed, 0)
+        return round(elapsed / self.processed * remaining, 1)
+
+    def to_dict(self):
+        elapsed_end = self._finished if self._finished is not None else self.clock()
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'processed': self.processed,
+            'total': self.total,
+            'eta_seconds': self.eta_seconds(),
+            'elapsed_seconds': round(elapsed_end - self._started, 2) if self._started else 0,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """Runs jobs on a thread pool and keeps finished ones for result_ttl seconds"""
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, result_ttl=JOB_RESULT_TTL,
+                 result_size=JOB_RESULT_SIZE, clock=time.monotonic):
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._active = {}
+        self._finished = TTLCache(maxsize=result_size, ttl=result_ttl, clock=clock)
+        self._lock = threading.Lock()
+
+    def submit(self, fn, total=None):
+        """Queue fn(job) and return the job at once
+
+        fn reports progress through job.set_stage / job.advance and returns
+        the result. A result dict with success False marks the job failed.
+        """
+        job = Job(total, clock=self.clock)
+        with self._lock:
+            self._active[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job.status = 'running'
+        job.stage = 'starting'
+        job._started = self.clock()
+        try:
+            job.result = fn(job)
+            if isinstance(job.result, dict) and job.result.get('success') is False:
+                job.status, job.error = 'failed', job.result.get('error')
+            else:
+                job.status = 'done'
+        except Exception as e:
+            job.status, job.error = 'failed', str(e)
+        job.stage = job.status
+        job._finished = self.clock()
+        with self._lock:
+            self._finished.set(job.id, job)
+            self._active.pop(job.id, None)
+
+    def get(self, job_id):
+        """The job with this id, or None if unknown or expired"""
+        with self._lock:
+            job = self._active.get(job_id)
+        return job if job is not None else self._finished.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            active = list(self._active.values())
+        return {
+            'queued': sum(1 for job in active if job.status == 'queued'),
+            'running': sum(1 for job in active if job.status == 'running'),
+            'finished_kept': len(self._finished)
+        }
@@ -0,0 +1,495 @@
+"""
+Near-duplicate detection over stored posts with MinHash and LSH.
+
+Each post's title and selftext are reduced to a set of shingles (words and
+word pairs, stop words left out) and summarized by a MinHash signature of
+MINHASH_PERMUTATIONS 32-bit values: the fraction of positions where two
+signatures agree estimates the Jaccard similarity of their shingle sets.
+Signatures are computed at ingest and stored as blobs in post_minhash.
+
+For lookups, each signature is cut into LSH_BANDS bands and every band is
+hashed to a bucket in minhash_buckets. Posts sharing any bucket are
+candidates, which are then checked against their full signatures, so
+finding a post's near-duplicates reads a handful of index rows instead of
+comparing it with every stored post. minhash_shared_buckets lists the
+buckets holding more than one post, kept current on every save, so grouping
+reposts only reads those instead of the whole index.
+
+Subreddits are compared by the MinHash of the words (pairs left out) in
+their SUBREDDIT_SAMPLE_POSTS most recent posts. A fixed window keeps the
+estimate about what each subreddit talks about now, instead of a union that
+only grows until every subreddit covers the whole vocabulary. The signature
+is kept in subreddit_vocab: saving a post bumps its subreddit's version, and
+the signature is recomputed by the next query that finds it out of date.
+
+Rebuild all four tables from reddit_posts:
+    python minhash.py rebuild
+"""
+
+import argparse
+import os
+import time
+import zlib
+
+import numpy as np
+
+import db
+from tokenizer import STOP_WORDS, WORD_RE, tokenize
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+
+# Estimated Jaccard similarity above which posts count as near-duplicates
+DUPLICATE_THRESHOLD = 0.7
+
+# Members of one bucket compared when listing duplicate groups
+MAX_BUCKET_SIZE = 200
+
+# Fixed seed, so signatures stay comparable across processes and restarts
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_PAIR_MULTIPLIER = np.uint64(0x9E3779B1)
+# Above any permuted value, so a masked-out pair never wins the minimum
+_NO_PAIR = np.uint64(1 << 32)
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+# Posts per NumPy pass when computing signatures
+SIGNATURE_CHUNK_SIZE = 256
+
+# Recent posts whose words make up a subreddit's signature
+SUBREDDIT_SAMPLE_POSTS = int(os.environ.get('SUBREDDIT_SAMPLE_POSTS', 500))
+
+UPSERT_SIGNATURE_SQL = '''INSERT INTO post_minhash (post_id, subreddit, text_hash, signature)
+                          VALUES (?, ?, ?, ?)
+                          ON CONFLICT (post_id) DO UPDATE SET
+                            subreddit = excluded.subreddit,
+                            text_hash = excluded.text_hash,
+                            signature = excluded.signature'''
+
+# A subreddit's recent posts changed, so its stored signature is out of date
+TOUCH_VOCAB_SQL = '''INSERT INTO subreddit_vocab (subreddit, version) VALUES (?, 1)
+                     ON CONFLICT (subreddit) DO UPDATE SET version = version + 1'''
+
+
+def init_minhash_schema(conn):
+    """Create post_minhash, minhash_buckets, minhash_shared_buckets and subreddit_vocab"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS post_minhash
+                    (post_id TEXT PRIMARY KEY,
+                     subreddit TEXT,
+                     text_hash INTEGER,
+                     signature BLOB)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS minhash_buckets
+                    (bucket INTEGER,
+                     post_id TEXT,
+                     PRIMARY KEY (bucket, post_id)) WITHOUT ROWID''')
+    shared = conn.execute("SELECT 1 FROM sqlite_master "
+                          "WHERE name = 'minhash_shared_buckets'").fetchone()
+    conn.execute('''CREATE TABLE IF NOT EXISTS minhash_shared_buckets
+                    (bucket INTEGER PRIMARY KEY)''')
+    if not shared:
+        conn.execute('INSERT INTO minhash_shared_buckets '
+                     'SELECT bucket FROM minhash_buckets GROUP BY bucket HAVING COUNT(*) > 1')
+    # Subreddit signatures used to be folded in here as posts arrived
+    conn.execute('DROP TABLE IF EXISTS subreddit_minhash')
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'subreddit_vocab'").fetchone()
+    conn.execute('''CREATE TABLE IF NOT EXISTS subreddit_vocab
+                    (subreddit TEXT PRIMARY KEY,
+                     version INTEGER,
+                     signed_version INTEGER,
+                     posts INTEGER,
+                     signature BLOB) WITHOUT ROWID''')
+    if not exists:
+        conn.execute('INSERT INTO subreddit_vocab (subreddit, version) '
+                     'SELECT DISTINCT lower(subreddit), 1 FROM reddit_posts '
+                     'WHERE subreddit IS NOT NULL')
+
+
+def shingles(text):
+    """Words and adjacent word pairs of text, stop words left out"""
+    words = tokenize(text, stop_words=STOP_WORDS, min_length=2, pattern=WORD_RE)
+    return set(words).union(map(' '.join, zip(words, words[1:])))
+
+
+def _permute(hashes):
+    """Each hash under every permutation: shape (MINHASH_PERMUTATIONS, len(hashes))"""
+    # Multiply-add-shift hashing, one function per permutation (wraps mod 2**64)
+    with np.errstate(over='ignore'):
+        return (_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)
+
+
+def signatures(texts):
+    """MinHash signatures (uint32 arrays) of texts; None for a text without shingles
+
+    Words are hashed once per chunk of SIGNATURE_CHUNK_SIZE texts and word
+    pairs are hashed by mixing their words' hashes, then every signature in
+    the chunk comes out of one NumPy reduction.
+    """
+    result = []
+    for start in range(0, len(texts), SIGNATURE_CHUNK_SIZE):
+        tokenized = [tokenize(text, stop_words=STOP_WORDS, min_length=2, pattern=WORD_RE)
+                     for text in texts[start:start + SIGNATURE_CHUNK_SIZE]]
+        present = [words for words in tokenized if words]
+        if present:
+            cache = {}
+            hashes = np.fromiter((cache[word] if word in cache else
+                                  cache.setdefault(word, zlib.crc32(word.encode('utf-8')))
+                                  for words in present for word in words), dtype=np.uint64)
+            offsets = np.cumsum([0] + [len(words) for words in present[:-1]])
+            mins = np.minimum.reduceat(_permute(hashes), offsets, axis=1)
+            if len(hashes) > 1:
+                with np.errstate(over='ignore'):
+                    pairs = (hashes[:-1] * _PAIR_MULTIPLIER + hashes[1:] + np.uint64(1)) & _MASK32
+                permuted = _permute(pairs)
+                # Pairs that straddle two texts belong to neither
+                permuted[:, offsets[1:] - 1] = _NO_PAIR
+                pair_mins = np.minimum.reduceat(permuted, np.minimum(offsets, len(pairs) - 1),
+                                                axis=1)
+                mins = np.minimum(mins, pair_mins)
+            found = iter(mins.T.astype(np.uint32))
+        result.extend(next(found) if words else None for words in tokenized)
+    return result
+
+
+def signature(text):
+    """MinHash signature (uint32 array) of text, or None if it has no shingles"""
+    return signatures([text])[0]
+
+
+def post_text(post):
+    return f"{post['title']} {post['selftext'] or ''}"
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+def _to_blob(sig):
+    return sig.astype('<u4').tobytes()
+
+
+def _from_blob(blob):
+    return np.frombuffer(blob, dtype='<u4').astype(np.uint32)
+
+
+def band_buckets(sigs):
+    """LSH bucket keys (signed 64-bit ints) of each signature's bands
+
+    Takes one signature or a 2-D array of them and returns a list of
+    LSH_BANDS keys, or one such list per signature.
+    """
+    sigs = np.asarray(sigs)
+    bands = np.atleast_2d(sigs).astype(np.uint64).reshape(-1, LSH_BANDS, ROWS_PER_BAND)
+    with np.errstate(over='ignore'):
+        # FNV-1a over the band's values, seeded with the band number
+        keys = np.broadcast_to((np.arange(LSH_BANDS, dtype=np.uint64) + np.uint64(1))
+                               * _FNV_OFFSET, bands.shape[:2])
+        for row in range(ROWS_PER_BAND):
+            keys = (keys ^ bands[:, :, row]) * _FNV_PRIME
+        # splitmix64 finalizer, so nearby values spread over the whole key space
+        keys ^= keys >> np.uint64(31)
+        keys *= np.uint64(0xBF58476D1CE4E5B9)
+        keys ^= keys >> np.uint64(27)
+    keys = keys.view(np.int64).tolist()
+    return keys[0] if sigs.ndim == 1 else keys
+
+
+def _stored_signatures(conn, ids):
+    rows = db.select_in(conn, 'SELECT post_id, subreddit, signature, text_hash '
+                              'FROM post_minhash WHERE post_id IN ({ids})', ids)
+    return {row[0]: row[1:] for row in rows}
+
+
+def save_signatures(conn, posts, subreddit=None):
+    """Compute and index signatures for posts on conn; the caller commits
+
+    Posts whose text hasn't changed since they were last stored are skipped
+    before their signature is computed.
+    """
+    posts = list({str(post['id']): post for post in posts}.values())
+    stored = _stored_signatures(conn, [str(post['id']) for post in posts])
+
+    pending = []
+    for post in posts:
+        text = post_text(post)
+        text_hash = zlib.crc32(text.encode('utf-8'))
+        old = stored.get(str(post['id']))
+        if old is None or old[2] != text_hash:
+            pending.append((post, text, text_hash, old))
+
+    rows, changed, replaced, emptied = [], [], [], []
+    touched = {(post.get('subreddit') or subreddit or '').lower() for post, _, _, _ in pending}
+    for (post, _, text_hash, old), sig in zip(pending, signatures([p[1] for p in pending])):
+        post_id = str(post['id'])
+        if old is not None:
+            replaced.append((post_id, _from_blob(old[1])))
+        if sig is None:
+            if old is not None:
+                emptied.append((post_id,))
+            continue
+        name = (post.get('subreddit') or subreddit or '').lower()
+        rows.append((post_id, name, text_hash, _to_blob(sig)))
+        changed.append((post_id, sig))
+
+    old_buckets = _bucket_rows(replaced)
+    new_buckets = _bucket_rows(changed)
+    if old_buckets:
+        conn.executemany('DELETE FROM minhash_buckets WHERE bucket = ? AND post_id = ?',
+                         old_buckets)
+    if emptied:
+        conn.executemany('DELETE FROM post_minhash WHERE post_id = ?', emptied)
+    conn.executemany(UPSERT_SIGNATURE_SQL, rows)
+    conn.executemany('INSERT OR IGNORE INTO minhash_buckets (bucket, post_id) VALUES (?, ?)',
+                     new_buckets)
+    _update_shared_buckets(conn, {bucket for bucket, _ in old_buckets + new_buckets})
+    conn.executemany(TOUCH_VOCAB_SQL, [(name,) for name in sorted(touched) if name])
+    return len(rows)
+
+
+def _bucket_rows(signed):
+    """(bucket, post_id) rows for [(post_id, signature)]"""
+    if not signed:
+        return []
+    keys = band_buckets(np.stack([sig for _, sig in signed]))
+    return [(bucket, post_id) for (post_id, _), buckets in zip(signed, keys)
+            for bucket in buckets]
+
+
+def _update_shared_buckets(conn, buckets):
+    """Re-check which of buckets hold more than one post after a save"""
+    if not buckets:
+        return
+    shared = {row[0] for row in db.select_in(
+        conn, 'SELECT bucket FROM minhash_buckets WHERE bucket IN ({ids}) '
+              'GROUP BY bucket HAVING COUNT(*) > 1', list(buckets))}
+    conn.executemany('INSERT OR IGNORE INTO minhash_shared_buckets (bucket) VALUES (?)',
+                     [(bucket,) for bucket in shared])
+    conn.executemany('DELETE FROM minhash_shared_buckets WHERE bucket = ?',
+                     [(bucket,) for bucket in buckets - shared])
+
+
+def _load_signatures(conn, ids):
+    """post_id -> signature for the given ids"""
+    return {post_id: _from_blob(blob)
+            for post_id, (_, blob, _) in _stored_signatures(conn, list(ids)).items()}
+
+
+def _describe(conn, scored):
+    """Attach subreddit and title to [(similarity, post_id)]"""
+    ids = [post_id for _, post_id in scored]
+    posts = {row[0]: row for row in db.select_in(
+        conn, 'SELECT id, subreddit, title, created_utc FROM reddit_posts WHERE id IN ({ids})', ids)}
+    return [{'id': post_id, 'subreddit': posts[post_id][1], 'title': posts[post_id][2],
+             'created_utc': posts[post_id][3], 'similarity': round(score, 4)}
+            for score, post_id in scored if post_id in posts]
+
+
+def similar_posts(post_id=None, text=None, threshold=DUPLICATE_THRESHOLD, limit=20):
+    """Stored posts whose text is a near-duplicate of a stored post or of text
+
+    Candidates come from the LSH buckets the signature falls in, and are
+    kept if their estimated Jaccard similarity is at least threshold.
+    """
+    conn = db.get_connection()
+    if post_id is not None:
+        sig = _load_signatures(conn, [str(post_id)]).get(str(post_id))
+        if sig is None:
+            raise ValueError(f'No stored post {post_id!r}')
+    else:
+        sig = signature(text or '')
+        if sig is None:
+            return []
+
+    buckets = band_buckets(sig)
+    candidates = {row[0] for row in conn.execute(
+        'SELECT DISTINCT post_id FROM minhash_buckets '
+        f'WHERE bucket IN ({", ".join("?" * len(buckets))})', buckets)}
+    candidates.discard(str(post_id) if post_id is not None else None)
+
+    scored = []
+    for candidate, candidate_sig in _load_signatures(conn, candidates).items():
+        score = similarity(sig, candidate_sig)
+        if score >= threshold:
+            scored.append((score, candidate))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return _describe(conn, scored[:limit])
+
+
+def duplicate_groups(subreddit=None, threshold=DUPLICATE_THRESHOLD, cross_only=False,
+                     limit=20):
+    """Groups of near-duplicate posts, largest first
+
+    Reads only the shared buckets: posts that share a bucket are compared
+    (each with the bucket's first member, at most MAX_BUCKET_SIZE of them)
+    and confirmed pairs are joined into groups. subreddit keeps groups
+    with a post from it; cross_only keeps groups spanning subreddits
+    (crossposts and reposts elsewhere).
+    """
+    conn = db.get_connection()
+    # CROSS JOIN keeps SQLite from scanning minhash_buckets and probing the shared ones
+    rows = conn.execute('SELECT s.bucket, b.post_id FROM minhash_shared_buckets s '
+                        'CROSS JOIN minhash_buckets b ON b.bucket = s.bucket ORDER BY s.bucket')
+    buckets = {}
+    for bucket, post_id in rows:
+        members = buckets.setdefault(bucket, [])
+        if len(members) < MAX_BUCKET_SIZE:
+            members.append(post_id)
+
+    stored = _stored_signatures(conn, list({post_id for members in buckets.values()
+                                            for post_id in members}))
+    parent = {}
+
+    def find(post_id):
+        # Path halving
+        while parent.get(post_id, post_id) != post_id:
+            parent[post_id] = parent.get(parent[post_id], parent[post_id])
+            post_id = parent[post_id]
+        return post_id
+
+    for members in buckets.values():
+        first = _from_blob(stored[members[0]][1])
+        for other in members[1:]:
+            if find(members[0]) != find(other) and \
+                    similarity(first, _from_blob(stored[other][1])) >= threshold:
+                parent[find(other)] = find(members[0])
+
+    groups = {}
+    for post_id in parent:
+        groups.setdefault(find(post_id), set()).add(post_id)
+    for root, members in groups.items():
+        members.add(root)
+
+    result = []
+    wanted = subreddit.lower() if subreddit else None
+    for members in sorted(groups.values(), key=lambda members: (-len(members), min(members))):
+        subreddits = sorted({stored[post_id][0] or '' for post_id in members})
+        if wanted and wanted not in subreddits:
+            continue
+        if cross_only and len(subreddits) < 2:
+            continue
+        posts = _describe(conn, [(1.0, post_id) for post_id in sorted(members)])
+        for post in posts:
+            del post['similarity']
+        result.append({'size': len(posts), 'subreddits': subreddits, 'posts': posts})
+        if len(result) >= limit:
+            break
+    return result
+
+
+def vocabulary_signature(texts):
+    """MinHash signature of the words (no pairs) across texts, or None if there are none"""
+    words = set()
+    for text in texts:
+        words.update(tokenize(text, stop_words=STOP_WORDS, min_length=2, pattern=WORD_RE))
+    if not words:
+        return None
+    hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words),
+                         dtype=np.uint64, count=len(words))
+    return _permute(hashes).min(axis=1).astype(np.uint32)
+
+
+def _subreddit_signature(conn, name, sample=SUBREDDIT_SAMPLE_POSTS):
+    """(signature, posts sampled) of a subreddit's most recent posts; signature None if empty"""
+    rows = conn.execute('SELECT title, selftext FROM reddit_posts '
+                        'WHERE subreddit = ? COLLATE NOCASE '
+                        'ORDER BY created_utc DESC LIMIT ?', (name, sample)).fetchall()
+    return vocabulary_signature(f'{title} {selftext or ""}' for title, selftext in rows), len(rows)
+
+
+def _subreddit_signatures(conn, names=None):
+    """name -> (signature, posts sampled) for the named (default: all) stored subreddits
+
+    Stored signatures are used while their version is current; the rest are
+    recomputed from the subreddit's recent posts and written back.
+    """
+    sql = 'SELECT subreddit, version, signed_version, posts, signature FROM subreddit_vocab'
+    params = []
+    if names:
+        sql += f' WHERE subreddit IN ({", ".join("?" * len(names))})'
+        params = [name.lower() for name in names]
+    result, refreshed = {}, []
+    for name, version, signed_version, posts, blob in conn.execute(sql, params).fetchall():
+        if signed_version == version:
+            sig = _from_blob(blob) if blob is not None else None
+        else:
+            # A save after the version was read bumps it again, so this stays stale
+            sig, posts = _subreddit_signature(conn, name)
+            refreshed.append((version, posts, _to_blob(sig) if sig is not None else None, name))
+        if sig is not None:
+            result[name] = (sig, posts)
+    if refreshed:
+        with conn:
+            conn.executemany('UPDATE subreddit_vocab SET signed_version = ?, posts = ?, '
+                             'signature = ? WHERE subreddit = ?', refreshed)
+    return result
+
+
+def subreddit_similarity(first, second):
+    """Estimated Jaccard similarity of the words in two subreddits' recent posts"""
+    stored = _subreddit_signatures(db.get_connection(), [first, second])
+    missing = [name for name in (first, second) if name.lower() not in stored]
+    if missing:
+        raise ValueError(f'No stored posts for {", ".join(missing)}')
+    (sig_a, posts_a), (sig_b, posts_b) = stored[first.lower()], stored[second.lower()]
+    return {'subreddits': [first.lower(), second.lower()], 'posts': [posts_a, posts_b],
+            'similarity': round(similarity(sig_a, sig_b), 4)}
+
+
+def similar_subreddits(name, limit=10):
+    """Stored subreddits ranked by similarity to name"""
+    stored = _subreddit_signatures(db.get_connection())
+    if name.lower() not in stored:
+        raise ValueError(f'No stored posts for {name}')
+    sig = stored.pop(name.lower())[0]
+    ranked = sorted(((similarity(sig, other_sig), other, posts)
+                     for other, (other_sig, posts) in stored.items()),
+                    key=lambda item: (-item[0], item[1]))
+    return [{'subreddit': other, 'posts': posts, 'similarity': round(score, 4)}
+            for score, other, posts in ranked[:limit]]
+
+
+def rebuild(batch_size=5000):
+    """Recompute every signature and bucket from reddit_posts"""
+    start = time.perf_counter()
+    conn = db.get_connection()
+    read = db.connect()
+    try:
+        with conn:
+            for table in ('post_minhash', 'minhash_buckets', 'minhash_shared_buckets',
+                          'subreddit_vocab'):
+                conn.execute(f'DELETE FROM {table}')
+        cursor = read.execute('SELECT id, subreddit, title, selftext FROM reddit_posts')
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            posts = [{'id': row[0], 'subreddit': row[1], 'title': row[2], 'selftext': row[3]}
+                     for row in batch]
+            with conn:
+                save_signatures(conn, posts)
+    finally:
+        read.close()
+    rows = conn.execute('SELECT COUNT(*) FROM post_minhash').fetchone()[0]
+    return {'rows_written': rows, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the MinHash near-duplicate index')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help='recompute every signature from reddit_posts')
+    args = parser.parse_args()
+
+    from storage import init_db
+    init_db()
+    if args.command == 'rebuild':
+        result = rebuild()
+        print(f"Indexed {result['rows_written']} posts in {result['elapsed_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+"""
+Streaming analysis pipeline.
+Posts flow through generator stages one at a time:
+
+    fetch -> normalize -> tokenize -> aggregate -> trending -> persist
+
+Memory stays flat regardless of `limit`: aggregates are fixed-size
+(running sums, a 24-slot hour histogram, a top-k heap) and persistence
+flushes in bounded chunks. Word counts grow with the vocabulary, not with
+the number of posts.
+"""
+
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import trending
+from sources import normalize_record
+from storage import load_subreddit_state, save_post, save_posts, save_subreddit_state
+from tokenizer import ALPHA_WORD_RE, tokenize as tokenize_text
+
+# Common words left out of top_words
+TOP_WORDS_STOP_WORDS = frozenset({'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all',
+                                  'can', 'her', 'was', 'one', 'our', 'out', 'this', 'that',
+                                  'with', 'have', 'from', 'they', 'been', 'what', 'which'})
+
+# Rows per transaction when writing posts through
+PERSIST_BATCH_SIZE = 1000
+
+# Posts between partial results in analyze_stream
+STREAM_EVERY = 25
+
+# Most frequent words kept in a subreddit's incremental state
+STATE_MAX_WORDS = 5000
+
+# Most posts an incremental call reads while paging back to the watermark
+# (Reddit listings stop at about 1000 posts)
+INCREMENTAL_MAX_POSTS = int(os.environ.get('INCREMENTAL_MAX_POSTS', 1000))
+
+# Incremental runs read a subreddit's state, fetch, then write it back, so
+# runs on the same state (the ingest worker, /analyze, /jobs) go one at a time
+_state_locks = {}
+_state_locks_guard = threading.Lock()
+
+
+class Aggregate:
+    """Running totals for one analysis, updated one post at a time"""
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self.total_posts = 0
+        self.score_sum = 0
+        self.comments_sum = 0
+        self.posts_by_hour = [0] * 24
+        self.word_counts = Counter()
+        # Count given to words first seen after a saved state dropped its tail
+        self.word_floor = 0
+        # Min-heap of (score, -seq, post); -seq keeps the earliest post on ties
+        self._top = []
+        self._seq = 0
+
+    def add(self, post, words):
+        """Fold one post and its tokens into the totals"""
+        self.total_posts += 1
+        self.score_sum += post['score']
+        self.comments_sum += post['num_comments']
+        self.posts_by_hour[datetime.fromtimestamp(post['created_utc']).hour] += 1
+        if self.word_floor:
+            for word in set(words) - self.word_counts.keys():
+                self.word_counts[word] = self.word_floor
+        self.word_counts.update(words)
+
+        entry = (post['score'], -self._seq, post)
+        self._seq += 1
+        if len(self._top) < self.top_k:
+            heapq.heappush(self._top, entry)
+        else:
+            heapq.heappushpop(self._top, entry)
+
+    def top_posts(self):
+        """Highest scoring posts seen so far, best first"""
+        return [entry[2] for entry in sorted(self._top, reverse=True)]
+
+    def top_words(self, limit=20):
+        """Most frequent words, excluding common ones"""
+        return [(word, count) for word, count in self.word_counts.most_common(limit + 30)
+                if word not in TOP_WORDS_STOP_WORDS][:limit]
+
+    def result(self, subreddit_name):
+        """Build the /analyze response body"""
+        total = self.total_posts
+        return {
+            'success': True,
+            'subreddit': subreddit_name,
+            'total_posts': total,
+            'posts': self.top_posts(),
+            'top_words': self.top_words(),
+            'posts_by_hour': {hour: count for hour, count in enumerate(self.posts_by_hour) if count},
+            'avg_score': round(self.score_sum / total, 2) if total else 0,
+            'avg_comments': round(self.comments_sum / total, 2) if total else 0
+        }
+
+    def to_state(self, max_words=STATE_MAX_WORDS):
+        """JSON-able snapshot for subreddit_state
+
+        Only the max_words most frequent words are kept. As in a Space-Saving
+        summary, a word missing from the snapshot restarts at the smallest
+        kept count, never at zero: every word counted more often than that
+        stays tracked, and a count is high by at most that floor.
+        """
+        words = self.word_counts.most_common(max_words)
+        floor = self.word_floor
+        if len(self.word_counts) > max_words:
+            floor = max(floor, words[-1][1])
+        return {
+            'total_posts': self.total_posts,
+            'score_sum': self.score_sum,
+            'comments_sum': self.comments_sum,
+            'posts_by_hour': {hour: count for hour, count in enumerate(self.posts_by_hour) if count},
+            # Keep the state row bounded on busy subreddits
+            'word_counts': dict(words),
+            'word_floor': floor,
+            'top_posts': self.top_posts()
+        }
+
+    @classmethod
+    def from_state(cls, state, top_k=10):
+        """Rebuild an aggregate saved with to_state"""
+        agg = cls(top_k=top_k)
+        agg.total_posts = state['total_posts']
+        agg.score_sum = state['score_sum']
+        agg.comments_sum = state['comments_sum']
+        for hour, count in state['posts_by_hour'].items():
+            agg.posts_by_hour[int(hour)] = count
+        agg.word_counts = Counter(state['word_counts'])
+        agg.word_floor = state.get('word_floor', 0)
+        for post in state['top_posts']:
+            entry = (post['score'], -agg._seq, post)
+            agg._seq += 1
+            heapq.heappush(agg._top, entry)
+        return agg
+
+
+# Pipeline stages
+
+def fetch(source, subreddit_name, limit, sort='hot'):
+    """Stream records from a PostSource"""
+    return source.iter_posts(subreddit_name, limit, sort=sort)
+
+
+def normalize(records, subreddit_name):
+    """Coerce records to the reddit_posts shape"""
+    for record in records:
+        yield normalize_record(record, subreddit_name)
+
+
+def tokenize(records):
+    """Pair each post with the words of its title and selftext"""
+    for post in records:
+        yield post, tokenize_text(f"{post['title']} {post['selftext']}",
+                                  min_length=0, pattern=ALPHA_WORD_RE)
+
+
+def aggregate(items, agg):
+    """Fold (post, words) pairs into agg and pass the posts on"""
+    for post, words in items:
+        agg.add(post, words)
+        yield post
+
+
+def trend(records, tracker):
+    """Count each post's title into the trending windows and pass it on"""
+    for post in records:
+        tracker.add(post)
+        yield post
+
+
+def persist(records, subreddit_name, stats, batch_size=PERSIST_BATCH_SIZE, batch=True):
+    """Write posts to reddit_posts as they pass, one transaction per chunk
+
+    With batch=False each post goes through save_post on its own instead.
+    stats is updated in place with rows written and time spent.
+    """
+    buffer = []
+    for post in records:
+        if batch:
+            buffer.append(post)
+            if len(buffer) >= batch_size:
+                _flush(buffer, subreddit_name, stats)
+                buffer = []
+        else:
+            start = time.perf_counter()
+            save_post(post, subreddit_name)
+            stats['rows_written'] += 1
+            stats['elapsed_ms'] = round(stats['elapsed_ms'] + (time.perf_counter() - start) * 1000, 2)
+        yield post
+    if buffer:
+        _flush(buffer, subreddit_name, stats)
+
+
+def _flush(buffer, subreddit_name, stats):
+    written = save_posts(buffer, subreddit_name)
+    stats['rows_written'] += written['rows_written']
+    stats['elapsed_ms'] = round(stats['elapsed_ms'] + written['elapsed_ms'], 2)
+
+
+def track(records, progress):
+    """Report each post that has been fully processed to progress.advance()"""
+    for post in records:
+        progress.advance()
+        yield post
+
+
+def drain(stream):
+    """Pull a stream to the end"""
+    for _ in stream:
+        pass
+
+
+def _stage(timer, name, stream):
+    """Time a stage with timer, if there is one"""
+    return timer.wrap(name, stream) if timer is not None else stream
+
+
+def _new_persist_stats():
+    return {'rows_written': 0, 'elapsed_ms': 0}
+
+
+def analyze(source, subreddit_name, limit=100, batch_persist=True, incremental=False,
+            progress=None, timer=None):
+    """Run the full pipeline for one subreddit and return the analysis
+
+    With incremental=True only posts newer than the stored watermark are
+    fetched (see analyze_incremental). progress, if given, is told the
+    current stage (set_stage) and each post processed (advance). timer, an
+    instrumentation.StageTimer, collects the time spent in each stage.
+    """
+    if incremental:
+        return analyze_incremental(source, subreddit_name, limit, progress=progress, timer=timer)
+
+    agg = Aggregate()
+    persist_stats = _new_persist_stats()
+
+    stream = _stage(timer, 'fetch', fetch(source, subreddit_name, limit))
+    stream = _stage(timer, 'transform', tokenize(normalize(stream, subreddit_name)))
+    stream = _stage(timer, 'aggregate', aggregate(stream, agg))
+    if source.persist:
+        stream = _stage(timer, 'trending', trend(stream, trending.tracker))
+        stream = _stage(timer, 'persist', persist(stream, subreddit_name, persist_stats,
+                                                  batch=batch_persist))
+    _run(stream, progress)
+
+    result = agg.result(subreddit_name)
+    result['persist'] = persist_stats
+    return result
+
+
+def analyze_stream(source, subreddit_name, limit=100, every=STREAM_EVERY):
+    """Run the pipeline, yielding the running analysis every `every` posts
+
+    Partial results have done=False; the last one yielded is the complete
+    analysis (as returned by analyze) with done=True.
+    """
+    agg = Aggregate()
+    persist_stats = _new_persist_stats()
+
+    stream = normalize(fetch(source, subreddit_name, limit), subreddit_name)
+    stream = aggregate(tokenize(stream), agg)
+    if source.persist:
+        stream = persist(trend(stream, trending.tracker), subreddit_name, persist_stats)
+    for count, _ in enumerate(stream, 1):
+        if count % every == 0:
+            partial = agg.result(subreddit_name)
+            partial['done'] = False
+            yield partial
+
+    result = agg.result(subreddit_name)
+    result['persist'] = persist_stats
+    result['done'] = True
+    yield result
+
+
+class _NewPosts:
+    """Passes posts newer than a watermark and tracks the newest one seen.
+
+    Posts arrive newest first, so the stream stops at the first post older
+    than the watermark (and reached is set). Posts exactly at the watermark
+    are skipped if they were already counted last time.
+    """
+
+    def __init__(self, watermark, seen_ids):
+        self.watermark = watermark
+        self.seen_ids = set(seen_ids)
+        self.count = 0
+        self.newest = None
+        self.newest_ids = []
+        self.fetched = 0
+        self.reached = False
+
+    def filter(self, records):
+        for post in records:
+            self.fetched += 1
+            created = post['created_utc']
+            if created < self.watermark:
+                self.reached = True
+                break
+            if created == self.watermark and post['id'] in self.seen_ids:
+                continue
+            self.count += 1
+            if self.newest is None or created > self.newest:
+                self.newest, self.newest_ids = created, [post['id']]
+            elif created == self.newest:
+                self.newest_ids.append(post['id'])
+            yield post
+
+
+def _run(stream, progress):
+    if progress is None:
+        drain(stream)
+        return
+    progress.set_stage('streaming')
+    drain(track(stream, progress))
+    progress.set_stage('finishing')
+
+
+def analyze_incremental(source, subreddit_name, limit=100, progress=None, timer=None):
+    """Fold posts newer than the subreddit's watermark into its stored aggregate
+
+    Posts are read newest first. The first call reads `limit` posts; later
+    calls page back until they reach the watermark, so the cost of a call is
+    proportional to the new posts only and no new post is skipped. If more
+    than INCREMENTAL_MAX_POSTS arrived since the last call, the older ones
+    are out of reach and the result is marked truncated. Calls for the same
+    subreddit and source in this process wait for each other.
+    """
+    state_key = _state_key(source, subreddit_name)
+    with _state_lock(state_key):
+        return _analyze_incremental(source, subreddit_name, state_key, limit, progress, timer)
+
+
+def _analyze_incremental(source, subreddit_name, state_key, limit, progress, timer):
+    state = load_subreddit_state(state_key)
+    if state is None:
+        state = {'watermark': 0, 'watermark_ids': [], 'aggregate': None}
+    agg = Aggregate.from_state(state['aggregate']) if state['aggregate'] else Aggregate()
+    new_posts = _NewPosts(state['watermark'], state['watermark_ids'])
+    persist_stats = _new_persist_stats()
+    if state['watermark']:
+        limit = max(limit, INCREMENTAL_MAX_POSTS)
+
+    stream = _stage(timer, 'fetch', fetch(source, subreddit_name, limit, sort='new'))
+    stream = _stage(timer, 'transform',
+                    tokenize(new_posts.filter(normalize(stream, subreddit_name))))
+    stream = _stage(timer, 'aggregate', aggregate(stream, agg))
+    if source.persist:
+        stream = _stage(timer, 'trending', trend(stream, trending.tracker))
+        stream = _stage(timer, 'persist', persist(stream, subreddit_name, persist_stats))
+    _run(stream, progress)
+
+    watermark = state['watermark']
+    if new_posts.count:
+        watermark_ids = new_posts.newest_ids
+        if new_posts.newest == watermark:
+            watermark_ids += state['watermark_ids']
+        watermark = new_posts.newest
+        save_subreddit_state(state_key, watermark, watermark_ids, agg.to_state())
+
+    result = agg.result(subreddit_name)
+    result['persist'] = persist_stats
+    result['new_posts'] = new_posts.count
+    result['watermark'] = watermark
+    result['truncated'] = bool(state['watermark']) and not new_posts.reached \
+        and new_posts.fetched >= limit
+    if result['truncated']:
+        print(f"Incremental analysis of {subreddit_name} read {limit} posts without "
+              f"reaching its watermark; older new posts were skipped")
+    return result
+
+
+def stored_result(source, subreddit_name):
+    """Analysis from the stored incremental aggregate, without fetching
+
+    Returns None if nothing has been ingested for the subreddit yet.
+    """
+    state = load_subreddit_state(_state_key(source, subreddit_name))
+    if state is None or not state['aggregate']:
+        return None
+    result = Aggregate.from_state(state['aggregate']).result(subreddit_name)
+    result['watermark'] = state['watermark']
+    return result
+
+
+def _state_lock(state_key):
+    with _state_locks_guard:
+        return _state_locks.setdefault(state_key, threading.Lock())
+
+
+def _state_key(source, subreddit_name):
+    """subreddit_state key; non-Reddit sources keep separate watermarks"""
+    key = subreddit_name.lower()
+    return key if source.name == 'reddit' else f'{source.name}:{key}'
@@ -0,0 +1,208 @@
+"""
+Shared rate limiter for outgoing Reddit API requests.
+A token bucket refills at the allowed request rate. Waiting requests are
+queued per key (the subreddit being fetched) and served round-robin, so a
+large fetch for one subreddit can't starve the others. Reddit's
+X-Ratelimit-* response headers adjust the bucket as they arrive; 429 and
+5xx responses are retried with exponential backoff (see reddit_client).
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Reddit allows 100 requests per minute per OAuth client
+REDDIT_RATE = float(os.environ.get('REDDIT_RATE', 100 / 60))
+REDDIT_BURST = float(os.environ.get('REDDIT_BURST', 10))
+REDDIT_MAX_RETRIES = int(os.environ.get('REDDIT_MAX_RETRIES', 5))
+REDDIT_BACKOFF_BASE = float(os.environ.get('REDDIT_BACKOFF_BASE', 1.0))
+REDDIT_BACKOFF_MAX = float(os.environ.get('REDDIT_BACKOFF_MAX', 60.0))
+
+# Wait times kept for the stats percentiles
+WAIT_SAMPLE_SIZE = 1000
+
+
+class RateLimitTimeout(Exception):
+    """No token could be had within the caller's timeout"""
+
+
+class _Ticket:
+    __slots__ = ('granted', 'cancelled')
+
+    def __init__(self):
+        self.granted = False
+        self.cancelled = False
+
+
+class RateLimiter:
+    """Token bucket with per-key fair queuing
+
+    rate is tokens per second and capacity the largest burst. acquire(key)
+    blocks until this caller's turn comes up and a token is free.
+    """
+
+    def __init__(self, rate=REDDIT_RATE, capacity=REDDIT_BURST, max_retries=REDDIT_MAX_RETRIES,
+                 backoff_base=REDDIT_BACKOFF_BASE, backoff_max=REDDIT_BACKOFF_MAX,
+                 clock=time.monotonic, rng=None):
+        self.rate = rate
+        self.base_rate = rate
+        self.capacity = capacity
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = clock()
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+        self.granted = 0
+        self.retries = 0
+        self.throttled = 0
+        self.last_headers = {}
+        self._waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    # Bucket
+
+    def _refill(self, now):
+        if now > self._updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _dispatch(self, now):
+        """Hand out free tokens to queue heads, one key at a time (caller holds the lock)"""
+        self._refill(now)
+        granted = False
+        while self._queues and self.tokens >= 1 and now >= self.blocked_until:
+            key, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if ticket.cancelled:
+                continue
+            ticket.granted = True
+            self.tokens -= 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _time_to_token(self, now):
+        wait = max(self.blocked_until - now, 0)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def acquire(self, key=None, timeout=None):
+        """Block until a request for `key` may go out; returns seconds waited"""
+        key = self.current_key() if key is None else key
+        start = self.clock()
+        ticket = _Ticket()
+        with self._cond:
+            self._queues.setdefault(key, deque()).append(ticket)
+            self._dispatch(start)
+            while not ticket.granted:
+                now = self.clock()
+                if timeout is not None and now - start >= timeout:
+                    ticket.cancelled = True
+                    raise RateLimitTimeout(f'No request slot within {timeout}s')
+                wait = self._time_to_token(now)
+                if timeout is not None:
+                    wait = min(wait, timeout - (now - start))
+                self._cond.wait(max(wait, 0.001))
+                self._dispatch(self.clock())
+            waited = self.clock() - start
+            self.granted += 1
+            self._waits.append(waited)
+        return waited
+
+    # Feedback from responses
+
+    def update_from_headers(self, headers):
+        """Adjust the bucket to Reddit's X-Ratelimit-Remaining / -Reset headers
+
+        The remaining requests are spread over the time left in the window,
+        and nothing goes out once the window is used up.
+        """
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining, reset = float(remaining), float(reset)
+        except ValueError:
+            return
+        now = self.clock()
+        with self._cond:
+            self.last_headers = {'remaining': remaining, 'reset': reset,
+                                 'used': headers.get('x-ratelimit-used')}
+            self._refill(now)
+            if remaining < 1:
+                self.blocked_until = max(self.blocked_until, now + reset)
+                self.tokens = min(self.tokens, 0)
+                self.throttled += 1
+            else:
+                self.rate = max(remaining / max(reset, 1), self.base_rate / 10)
+                self.tokens = min(self.tokens, remaining)
+            self._cond.notify_all()
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based)
+
+        Honors a Retry-After value when the server sent one, and holds back
+        every other request for that long as well.
+        """
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = min(self.backoff_base * 2 ** attempt, self.backoff_max)
+            delay *= 1 + self.rng.uniform(0, 0.25)
+        with self._cond:
+            self.retries += 1
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+        return delay
+
+    # Fairness key for the current thread
+
+    def current_key(self):
+        return getattr(self._local, 'key', None)
+
+    def set_key(self, key):
+        """Tag requests made by this thread with key; returns the previous key"""
+        previous = self.current_key()
+        self._local.key = key
+        return previous
+
+    def stats(self):
+        """Queue depth, wait times and how the bucket has been adjusted"""
+        with self._cond:
+            self._refill(self.clock())
+            waits = sorted(self._waits)
+            queued = {str(key): sum(not t.cancelled for t in queue)
+                      for key, queue in self._queues.items()}
+            return {
+                'rate': round(self.rate, 4),
+                'capacity': self.capacity,
+                'tokens': round(self.tokens, 2),
+                'blocked_for': round(max(self.blocked_until - self.clock(), 0), 2),
+                'queue_depth': sum(queued.values()),
+                'queued_by_key': queued,
+                'granted': self.granted,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'wait_avg_ms': round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                'wait_p95_ms': round(waits[int(len(waits) * 0.95)] * 1000, 2) if waits else 0.0,
+                'wait_max_ms': round(waits[-1] * 1000, 2) if waits else 0.0,
+                'last_headers': self.last_headers
+            }
+
+
+# Shared by every Reddit client in the process
+limiter = RateLimiter()
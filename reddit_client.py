@@ -0,0 +1,181 @@
+"""
+Process-wide registry of PRAW clients.
+Clients are built per set of credentials and reused across requests,
+keeping their OAuth tokens; each is used by one thread at a time, and all
+clients for the same credentials share one HTTP session (keep-alive
+connections). Every HTTP request the clients make goes through the shared
+rate limiter.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import praw
+import prawcore
+import requests
+
+from ratelimit import limiter as rate_limiter
+
+# Read-only mode by default; set these for authenticated access and higher rate limits
+REDDIT_CLIENT_ID = os.environ.get('REDDIT_CLIENT_ID', 'read_only_mode')
+REDDIT_CLIENT_SECRET = os.environ.get('REDDIT_CLIENT_SECRET')
+REDDIT_USER_AGENT = os.environ.get('REDDIT_USER_AGENT', 'Social Media Analytics v1.0')
+
+# Point the clients at another server (e.g. a local stub) instead of reddit.com
+REDDIT_OAUTH_URL = os.environ.get('REDDIT_OAUTH_URL')
+REDDIT_URL = os.environ.get('REDDIT_URL')
+
+# Responses retried after a backoff
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RateLimitedRequestor(prawcore.Requestor):
+    """prawcore requestor that waits for the shared rate limiter before each request
+
+    Rate-limit headers on every response are fed back to the limiter, and
+    429 / 5xx responses and connection errors are retried with exponential
+    backoff (Retry-After is honored when present).
+    """
+
+    limiter = rate_limiter
+    sleep = staticmethod(time.sleep)
+
+    def request(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                response = super().request(*args, **kwargs)
+            except prawcore.exceptions.RequestException:
+                if attempt >= self.limiter.max_retries:
+                    raise
+                self.sleep(self.limiter.backoff(attempt))
+                attempt += 1
+                continue
+
+            self.limiter.update_from_headers(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt >= self.limiter.max_retries:
+                return response
+            self.sleep(self.limiter.backoff(attempt, _retry_after(response)))
+            attempt += 1
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header, if there is a numeric one"""
+    try:
+        return float(response.headers['retry-after'])
+    except (KeyError, ValueError):
+        return None
+
+
+def client_options():
+    """Options passed to every praw.Reddit built by the registry"""
+    options = {'requestor_class': RateLimitedRequestor}
+    if REDDIT_OAUTH_URL:
+        options['oauth_url'] = REDDIT_OAUTH_URL
+    if REDDIT_URL:
+        options['reddit_url'] = REDDIT_URL
+    return options
+
+
+class ClientRegistry:
+    """Lazily builds PRAW clients per (client_id, client_secret, user_agent)
+
+    PRAW isn't thread-safe, so a client is used by one thread at a time:
+    client() checks one out for the length of a with block and puts it back
+    on an idle list afterwards, building another only when every client is
+    busy. Clients for the same credentials share one requests session, so
+    they share its keep-alive connections.
+    """
+
+    def __init__(self, factory=praw.Reddit, options=None, session_factory=requests.Session):
+        self.factory = factory
+        self.options = client_options() if options is None else options
+        self.session_factory = session_factory
+        self.clients_created = 0
+        self.checkouts = 0
+        self._idle = {}         # key -> clients not checked out
+        self._sessions = {}     # key -> requests session shared by its clients
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self, client_id=None, client_secret=None, user_agent=None, **options):
+        """Check out a client for these credentials, creating one if all are busy"""
+        key = (client_id or REDDIT_CLIENT_ID,
+               client_secret if client_secret is not None else REDDIT_CLIENT_SECRET,
+               user_agent or REDDIT_USER_AGENT)
+        with self._lock:
+            idle = self._idle.get(key)
+            client = idle.pop() if idle else None
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self.session_factory()
+            self.checkouts += 1
+            self._in_use += 1
+        try:
+            if client is None:
+                client = self.factory(client_id=key[0], client_secret=key[1], user_agent=key[2],
+                                      requestor_kwargs={'session': session},
+                                      **dict(self.options, **options))
+                with self._lock:
+                    self.clients_created += 1
+            yield client
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                # Not handed back if reset() dropped its session meanwhile
+                if client is not None and self._sessions.get(key) is session:
+                    self._idle.setdefault(key, []).append(client)
+
+    def reset(self):
+        """Forget every idle client and session so the next checkout builds fresh ones"""
+        with self._lock:
+            self._idle.clear()
+            self._sessions.clear()
+
+    def stats(self):
+        """Client counts, and how many HTTP requests reused a kept-alive connection"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            stats = {
+                'active_clients': self._in_use + sum(len(idle) for idle in self._idle.values()),
+                'clients_in_use': self._in_use,
+                'clients_created': self.clients_created,
+                'checkouts': self.checkouts
+            }
+        http_requests = http_connections = 0
+        for session in sessions:
+            for pool in _connection_pools(session):
+                http_requests += pool.num_requests
+                http_connections += pool.num_connections
+        stats.update(http_requests=http_requests, http_connections=http_connections,
+                     connections_reused=max(http_requests - http_connections, 0))
+        return stats
+
+
+def _connection_pools(session):
+    """urllib3 connection pools currently open in a requests session"""
+    for adapter in session.adapters.values():
+        pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+        if pools is None:
+            continue
+        for key in list(pools.keys()):
+            try:
+                yield pools[key]
+            except KeyError:
+                pass
+
+
+registry = ClientRegistry()
+
+
+def get_reddit_client(**kwargs):
+    """Check out a Reddit client (read-only mode unless credentials are configured)
+
+        with get_reddit_client() as reddit:
+            ...
+    """
+    return registry.client(**kwargs)
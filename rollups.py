@@ -0,0 +1,159 @@
+"""
+Hourly rollups of stored posts, keyed by (subreddit, day, hour) in UTC.
+
+Each row holds the post count and score / comment sums for one hour of one
+day. Rows are kept up to date at ingest: before posts are upserted, their
+previous counts are read back and only the difference is applied, so
+re-fetching a post whose score moved adjusts its bucket instead of
+counting it twice. Hour-of-day queries then read at most 24 rows per day
+instead of scanning reddit_posts.
+
+Rebuild the table from reddit_posts (e.g. for data stored before it existed):
+    python rollups.py rebuild
+"""
+
+import argparse
+import time
+from collections import defaultdict
+
+import db
+
+SECONDS_PER_DAY = 86400
+
+UPSERT_ROLLUP_SQL = '''INSERT INTO hourly_rollups
+                       (subreddit, day, hour, post_count, score_sum, comment_sum)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (subreddit, day, hour) DO UPDATE SET
+                         post_count = post_count + excluded.post_count,
+                         score_sum = score_sum + excluded.score_sum,
+                         comment_sum = comment_sum + excluded.comment_sum'''
+
+
+def init_rollups_schema(conn):
+    """Create hourly_rollups; day is days since the epoch (UTC)"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS hourly_rollups
+                    (subreddit TEXT,
+                     day INTEGER,
+                     hour INTEGER,
+                     post_count INTEGER,
+                     score_sum INTEGER,
+                     comment_sum INTEGER,
+                     PRIMARY KEY (subreddit, day, hour)) WITHOUT ROWID''')
+
+
+def bucket(created_utc):
+    """(day, hour) in UTC for a timestamp"""
+    created = int(created_utc)
+    return created // SECONDS_PER_DAY, created % SECONDS_PER_DAY // 3600
+
+
+def _stored_counts(conn, ids):
+    """id -> (subreddit, score, num_comments, created_utc) for posts already stored"""
+    rows = db.select_in(conn, 'SELECT id, subreddit, score, num_comments, created_utc '
+                              'FROM reddit_posts WHERE id IN ({ids})', ids)
+    return {row[0]: row[1:] for row in rows}
+
+
+def apply_post_deltas(conn, posts, subreddit=None):
+    """Fold posts about to be upserted into hourly_rollups
+
+    The counts currently stored for the posts are subtracted first. The
+    caller holds the write lock (db.begin_immediate) and commits.
+    """
+    posts = list({str(post['id']): post for post in posts}.values())
+    stored = _stored_counts(conn, [str(post['id']) for post in posts])
+
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for post in posts:
+        old = stored.get(str(post['id']))
+        if old is not None:
+            delta = deltas[((old[0] or '').lower(),) + bucket(old[3] or 0)]
+            delta[0] -= 1
+            delta[1] -= old[1] or 0
+            delta[2] -= old[2] or 0
+        name = post.get('subreddit') or subreddit or ''
+        delta = deltas[(name.lower(),) + bucket(post['created_utc'] or 0)]
+        delta[0] += 1
+        delta[1] += post['score'] or 0
+        delta[2] += post['num_comments'] or 0
+
+    rows = [key + tuple(delta) for key, delta in deltas.items() if any(delta)]
+    if rows:
+        conn.executemany(UPSERT_ROLLUP_SQL, rows)
+        # Buckets a post moved out of may now be empty
+        emptied = [key for key, delta in deltas.items() if delta[0] < 0]
+        conn.executemany('DELETE FROM hourly_rollups WHERE subreddit = ? AND day = ? '
+                         'AND hour = ? AND post_count <= 0', emptied)
+    return len(rows)
+
+
+def rebuild():
+    """Recompute hourly_rollups from reddit_posts"""
+    start = time.perf_counter()
+    conn = db.get_connection()
+    with conn:
+        conn.execute('DELETE FROM hourly_rollups')
+        conn.execute(f'''INSERT INTO hourly_rollups
+                         SELECT lower(subreddit),
+                                CAST(created_utc AS INTEGER) / {SECONDS_PER_DAY},
+                                CAST(created_utc AS INTEGER) % {SECONDS_PER_DAY} / 3600,
+                                COUNT(*), SUM(score), SUM(num_comments)
+                         FROM reddit_posts GROUP BY 1, 2, 3''')
+    rows = conn.execute('SELECT COUNT(*) FROM hourly_rollups').fetchone()[0]
+    return {'rows_written': rows, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def hour_of_day(subreddit=None, days=None, tz_offset_hours=0, now=None):
+    """Posts, score and comment totals per hour of day from the rollups
+
+    days limits the window to the most recent days; tz_offset_hours shifts
+    UTC hours to local ones. Returns a list of 24 dicts, hour 0 first.
+    """
+    clauses, params = [], []
+    if subreddit:
+        clauses.append('subreddit = ?')
+        params.append(subreddit.lower())
+    if days:
+        now = time.time() if now is None else now
+        clauses.append('day > ?')
+        params.append(int(now) // SECONDS_PER_DAY - days)
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+
+    hours = [{'hour': hour, 'posts': 0, 'score': 0, 'comments': 0} for hour in range(24)]
+    rows = db.get_connection().execute(
+        'SELECT hour, SUM(post_count), SUM(score_sum), SUM(comment_sum) '
+        f'FROM hourly_rollups{where} GROUP BY hour', params).fetchall()
+    for hour, posts, score, comments in rows:
+        entry = hours[(hour + tz_offset_hours) % 24]
+        entry['posts'] += posts
+        entry['score'] += score
+        entry['comments'] += comments
+    return hours
+
+
+def peak_hours(hours):
+    """Busiest hour and hour with the highest average score, from hour_of_day"""
+    active = [h for h in hours if h['posts']]
+    if not active:
+        return {'busiest_hour': None, 'best_avg_score_hour': None}
+    return {
+        'busiest_hour': max(active, key=lambda h: h['posts'])['hour'],
+        'best_avg_score_hour': max(active, key=lambda h: h['score'] / h['posts'])['hour']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the hourly_rollups table')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help='recompute every rollup from reddit_posts')
+    args = parser.parse_args()
+
+    from storage import init_db
+    init_db()
+    if args.command == 'rebuild':
+        result = rebuild()
+        print(f"Rebuilt {result['rows_written']} rollup rows in {result['elapsed_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
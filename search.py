@@ -0,0 +1,150 @@
+"""
+Full-text search over stored posts.
+
+post_search is an FTS5 index of reddit_posts.title and selftext. It is an
+external-content table: it holds only the index and reads text back from
+reddit_posts by rowid. Triggers on reddit_posts keep it in sync, so the
+index is updated in the same transaction as every post write. Re-fetching
+a post whose text hasn't changed does not touch the index.
+
+Rebuild the index from reddit_posts (e.g. after a VACUUM, which may
+renumber rowids):
+    python search.py rebuild
+"""
+
+import argparse
+import re
+import time
+
+import db
+from cursors import decode_cursor, encode_cursor
+
+# Title matches count double in the bm25 ranking
+TITLE_WEIGHT = 2.0
+SELFTEXT_WEIGHT = 1.0
+
+# Words around each match in the returned snippet
+SNIPPET_TOKENS = 16
+
+SEARCH_COLUMNS = ('id', 'subreddit', 'title', 'author', 'score', 'num_comments',
+                  'created_utc', 'url', 'snippet', 'rank')
+
+_TERM_RE = re.compile(r'\w+\*?')
+
+
+def init_search_schema(conn):
+    """Create post_search and its sync triggers; indexes existing posts on first run"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'post_search'").fetchone()
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5
+                    (title, selftext,
+                     content='reddit_posts', content_rowid='rowid',
+                     tokenize='porter unicode61 remove_diacritics 2')''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS reddit_posts_search_insert
+                    AFTER INSERT ON reddit_posts BEGIN
+                      INSERT INTO post_search (rowid, title, selftext)
+                      VALUES (new.rowid, new.title, new.selftext);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS reddit_posts_search_delete
+                    AFTER DELETE ON reddit_posts BEGIN
+                      INSERT INTO post_search (post_search, rowid, title, selftext)
+                      VALUES ('delete', old.rowid, old.title, old.selftext);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS reddit_posts_search_update
+                    AFTER UPDATE OF title, selftext ON reddit_posts
+                    WHEN old.title IS NOT new.title OR old.selftext IS NOT new.selftext BEGIN
+                      INSERT INTO post_search (post_search, rowid, title, selftext)
+                      VALUES ('delete', old.rowid, old.title, old.selftext);
+                      INSERT INTO post_search (rowid, title, selftext)
+                      VALUES (new.rowid, new.title, new.selftext);
+                    END''')
+    if not exists:
+        conn.execute("INSERT INTO post_search (post_search) VALUES ('rebuild')")
+
+
+def rebuild():
+    """Re-index every stored post"""
+    start = time.perf_counter()
+    conn = db.get_connection()
+    with conn:
+        conn.execute("INSERT INTO post_search (post_search) VALUES ('rebuild')")
+    rows = conn.execute('SELECT COUNT(*) FROM reddit_posts').fetchone()[0]
+    return {'rows_indexed': rows, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def match_query(text):
+    """FTS5 query matching posts that contain every word of text
+
+    Words are quoted, so FTS5 operators and punctuation in user input are
+    taken literally; a trailing * keeps its meaning as a prefix search.
+    Returns None when text has no words.
+    """
+    terms = []
+    for term in _TERM_RE.findall(text or ''):
+        prefix = term.endswith('*')
+        word = term.rstrip('*')
+        terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms) or None
+
+
+def search_posts(text, subreddit=None, since=None, until=None, cursor=None, limit=20):
+    """One page of stored posts matching text, best bm25 rank first
+
+    since and until bound created_utc (epoch seconds, until exclusive).
+    Pages are keyset-paginated on (rank, rowid) like load_history, and the
+    returned rank is bm25's, where lower is better. Returns
+    (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = match_query(text)
+    if query is None:
+        return [], None
+
+    clauses, params = ['post_search MATCH ?'], [query]
+    if subreddit:
+        clauses.append('p.subreddit = ? COLLATE NOCASE')
+        params.append(subreddit)
+    if since is not None:
+        clauses.append('p.created_utc >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append('p.created_utc < ?')
+        params.append(until)
+
+    sql = f'''SELECT p.id, p.subreddit, p.title, p.author, p.score, p.num_comments,
+                     p.created_utc, p.url,
+                     snippet(post_search, -1, '[', ']', '...', {SNIPPET_TOKENS}),
+                     bm25(post_search, {TITLE_WEIGHT}, {SELFTEXT_WEIGHT}) AS rank,
+                     p.rowid AS post_rowid
+              FROM post_search JOIN reddit_posts p ON p.rowid = post_search.rowid
+              WHERE {' AND '.join(clauses)}'''
+    if cursor:
+        # Rank can't be compared inside the MATCH query itself, so page outside it
+        last_rank, last_rowid = decode_cursor(cursor)
+        sql = f'SELECT * FROM ({sql}) WHERE (rank, post_rowid) > (?, ?)'
+        params.extend((float(last_rank), last_rowid))
+    sql += ' ORDER BY rank, post_rowid LIMIT ?'
+    params.append(limit + 1)
+
+    rows = db.get_connection().execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][9], rows[-1][10])
+
+    return [dict(zip(SEARCH_COLUMNS, row)) for row in rows], next_cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the post_search index')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help='re-index every post in reddit_posts')
+    args = parser.parse_args()
+
+    from storage import init_db
+    init_db()
+    if args.command == 'rebuild':
+        result = rebuild()
+        print(f"Indexed {result['rows_indexed']} posts in {result['elapsed_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
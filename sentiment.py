@@ -0,0 +1,152 @@
+"""
+Lexicon-based sentiment engine shared by the sentiment helpers.
+Lexicons are compiled once into word -> weight tables; texts are tokenized
+with the shared tokenizer and scored against any of the loaded lexicons.
+Results can be cached by text hash.
+"""
+
+import hashlib
+import json
+import os
+from itertools import repeat
+
+from cache import TTLCache
+from tokenizer import WORD_RE
+
+# Union of the word lists used across the app's helpers
+DEFAULT_POSITIVE = frozenset({
+    'amazing', 'awesome', 'best', 'cool', 'excellent', 'fantastic', 'good', 'great', 'happy',
+    'helpful', 'incredible', 'interesting', 'love', 'perfect', 'positive', 'success', 'thanks',
+    'top', 'upvote', 'useful', 'win', 'wonderful'
+})
+DEFAULT_NEGATIVE = frozenset({
+    'annoying', 'awful', 'bad', 'boring', 'broken', 'disappointing', 'downvote', 'error', 'fail',
+    'failure', 'hate', 'horrible', 'issue', 'loss', 'negative', 'poor', 'problem', 'sad',
+    'terrible', 'useless', 'worst', 'wrong'
+})
+
+# Optional JSON lexicon file replacing the default lexicon and/or helpers' named lexicons
+SENTIMENT_LEXICON = os.environ.get('SENTIMENT_LEXICON')
+# Results cached per text hash by the shared engine (0 disables the cache)
+SENTIMENT_CACHE_SIZE = int(os.environ.get('SENTIMENT_CACHE_SIZE', 0))
+
+
+def _compile(positive, negative):
+    """Build a word -> weight table; lists weigh +1/-1, dicts carry their own weights"""
+    weights = {}
+    if isinstance(positive, dict):
+        weights.update({w.lower(): float(v) for w, v in positive.items()})
+    else:
+        weights.update({w.lower(): 1 for w in positive})
+    if isinstance(negative, dict):
+        weights.update({w.lower(): -abs(float(v)) for w, v in negative.items()})
+    else:
+        weights.update({w.lower(): -1 for w in negative})
+    return weights
+
+
+class SentimentEngine:
+    """Scores texts against one or more named lexicons
+
+    lexicons maps a name to (positive, negative) word collections. A call
+    returns (score, token_count), where score is the summed word weights.
+    With distinct=True each word counts once per text.
+    """
+
+    def __init__(self, lexicons=None, pattern=WORD_RE, cache_size=0, pinned=()):
+        if lexicons is None:
+            lexicons = {'default': (DEFAULT_POSITIVE, DEFAULT_NEGATIVE)}
+        self.pattern = pattern
+        self._weights = {name: _compile(pos, neg) for name, (pos, neg) in lexicons.items()}
+        self.default = next(iter(self._weights))
+        # Lexicons add_lexicon leaves alone (those loaded from a file)
+        self.pinned = frozenset(pinned)
+        self.cache = TTLCache(maxsize=cache_size, ttl=float('inf')) if cache_size else None
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Load lexicons from JSON
+
+        Either {"positive": [...], "negative": [...]} for a single 'default'
+        lexicon, or {name: {"positive": ..., "negative": ...}, ...}. Word
+        lists may be dicts of word -> weight. A named entry such as
+        "utils.analyze_sentiment" replaces that helper's word list: helpers
+        registering it later through add_lexicon keep the file's version.
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if 'positive' in data or 'negative' in data:
+            data = {'default': data}
+        lexicons = {name: (spec.get('positive', []), spec.get('negative', []))
+                    for name, spec in data.items()}
+        if 'default' not in lexicons:
+            lexicons = dict({'default': (DEFAULT_POSITIVE, DEFAULT_NEGATIVE)}, **lexicons)
+        return cls(lexicons, pinned=data.keys(), **kwargs)
+
+    def add_lexicon(self, name, positive, negative):
+        """Compile and register another lexicon, unless it was pinned by a lexicon file"""
+        if name not in self.pinned:
+            self._weights[name] = _compile(positive, negative)
+
+    @property
+    def lexicons(self):
+        return list(self._weights)
+
+    def score(self, text, lexicon=None, distinct=False):
+        """Return (score, token_count) for one text"""
+        name = lexicon or self.default
+        if self.cache is not None:
+            digest = hashlib.blake2b((text or '').encode('utf-8'), digest_size=16).digest()
+            key = (name, distinct, digest)
+            cached = self.cache.get(key)
+            if cached is None:
+                cached = self._score(text, self._weights[name], distinct)
+                self.cache.set(key, cached)
+            return cached
+        return self._score(text, self._weights[name], distinct)
+
+    def _score(self, text, weights, distinct):
+        tokens = self.pattern.findall(text.lower()) if text else []
+        if distinct:
+            tokens = set(tokens)
+        return sum(map(weights.get, tokens, repeat(0))), len(tokens)
+
+    def score_batch(self, texts, lexicon=None, distinct=False):
+        """Return [(score, token_count), ...] for many texts in one call"""
+        if self.cache is not None:
+            return [self.score(text or '', lexicon, distinct) for text in texts]
+
+        weights = self._weights[lexicon or self.default]
+        get = weights.get
+        findall = self.pattern.findall
+        results = []
+        for text in texts:
+            tokens = findall(text.lower()) if text else []
+            if distinct:
+                tokens = set(tokens)
+            results.append((sum(map(get, tokens, repeat(0))), len(tokens)))
+        return results
+
+    def label(self, text, lexicon=None):
+        """'positive', 'negative' or 'neutral'"""
+        return label_for(self.score(text, lexicon)[0])
+
+    def polarity_batch(self, texts, lexicon=None):
+        """Score per token for many texts, in [-1, 1] for unit weights"""
+        return [score / count if count else 0.0
+                for score, count in self.score_batch(texts, lexicon)]
+
+
+def label_for(score):
+    """Map a numeric score to 'positive', 'negative' or 'neutral'"""
+    return 'positive' if score > 0 else 'negative' if score < 0 else 'neutral'
+
+
+def _default_engine():
+    if SENTIMENT_LEXICON:
+        return SentimentEngine.from_file(SENTIMENT_LEXICON, cache_size=SENTIMENT_CACHE_SIZE)
+    return SentimentEngine(cache_size=SENTIMENT_CACHE_SIZE)
+
+
+# Shared engine; helper modules register their own word lists on it by name
+engine = _default_engine()
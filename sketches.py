@@ -0,0 +1,363 @@
+"""
+Approximate word frequencies in fixed memory.
+
+Each (subreddit, UTC day) of stored posts gets a WordSketch: a Count-Min
+Sketch that estimates any word's count, plus a Space-Saving summary that
+tracks the heaviest words. Both only ever overestimate, by at most
+SKETCH_EPSILON * total (with probability 1 - SKETCH_DELTA) for the sketch
+and total / SKETCH_TOP_K for the summary. A second row per day under the
+subreddit '*' covers every subreddit.
+
+Sketches of the same size merge by adding them up, so the top words of
+any subreddit over any range of days come from merging that many rows, in
+memory that doesn't grow with the number of posts. Rows are updated at
+ingest, and a post only counts the first time it is stored. Deciding which
+posts are new and rewriting the sketch blobs are reads followed by writes,
+so the caller must hold the write lock first (db.begin_immediate, as
+storage.save_posts does); sqlite3's own transaction only begins at the
+first write, too late to keep two writers from counting the same post.
+
+Rebuild word_sketches from reddit_posts (e.g. after changing the error
+bounds, since sketches of different sizes can't be merged):
+    python sketches.py rebuild
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import struct
+import time
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import db
+from tokenizer import ALPHA_WORD_RE, STOP_WORDS, tokenize
+
+SKETCH_EPSILON = float(os.environ.get('SKETCH_EPSILON', 0.001))
+SKETCH_DELTA = float(os.environ.get('SKETCH_DELTA', 0.01))
+SKETCH_TOP_K = int(os.environ.get('SKETCH_TOP_K', 500))
+
+# Subreddit key of the rows that cover every subreddit
+ALL_SUBREDDITS = '*'
+
+SECONDS_PER_DAY = 86400
+
+UPSERT_SKETCH_SQL = '''INSERT INTO word_sketches (subreddit, day, total, sketch, updated_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT (subreddit, day) DO UPDATE SET
+                         total = excluded.total,
+                         sketch = excluded.sketch,
+                         updated_at = excluded.updated_at'''
+
+_HEADER = struct.Struct('<IIIqI')
+
+
+def init_sketches_schema(conn):
+    """Create word_sketches; day is days since the epoch (UTC)"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS word_sketches
+                    (subreddit TEXT,
+                     day INTEGER,
+                     total INTEGER,
+                     sketch BLOB,
+                     updated_at REAL,
+                     PRIMARY KEY (subreddit, day))''')
+
+
+def _hashes(terms):
+    """Stable 64-bit hashes (Python's hash() changes between processes)"""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8)
+                                       .digest(), 'little') for term in terms),
+                       dtype=np.uint64, count=len(terms))
+
+
+class CountMinSketch:
+    """depth rows of width counters; a word's estimate is its smallest counter"""
+
+    def __init__(self, width, depth, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+
+    @classmethod
+    def from_error(cls, epsilon=SKETCH_EPSILON, delta=SKETCH_DELTA):
+        """Sketch overcounting by at most epsilon * total with probability 1 - delta"""
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _columns(self, terms):
+        # Double hashing: row i uses h1 + i * h2
+        hashes = _hashes(terms)
+        h1, h2 = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, counts):
+        """Add a {term: count} mapping"""
+        if not counts:
+            return
+        terms = list(counts)
+        columns = self._columns(terms)
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(terms))
+        flat = columns + (np.arange(self.depth) * self.width)[:, None]
+        np.add.at(self.table.reshape(-1), flat.ravel(), np.tile(values, self.depth))
+
+    def estimates(self, terms):
+        """Estimated counts for a list of terms"""
+        if not terms:
+            return []
+        columns = self._columns(terms)
+        found = self.table[np.arange(self.depth)[:, None], columns]
+        return found.min(axis=0).tolist()
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('Sketches of different sizes can not be merged')
+        self.table += other.table
+
+
+class SpaceSaving:
+    """The `capacity` heaviest terms with overestimated counts
+
+    Each tracked term has a count and an error: its true count lies in
+    [count - error, count]. Updates and merges follow the mergeable
+    Space-Saving summary: a term the summary doesn't track is assumed to
+    have the smallest tracked count (zero until the summary is full).
+    """
+
+    def __init__(self, capacity=SKETCH_TOP_K):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def floor(self):
+        """Largest count an untracked term can have"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def _truncate(self):
+        if len(self.counts) > self.capacity:
+            keep = heapq.nlargest(self.capacity, self.counts.items(), key=lambda item: item[1])
+            self.errors = {term: self.errors[term] for term, _ in keep}
+            self.counts = dict(keep)
+
+    def add(self, counts):
+        """Add a {term: count} mapping"""
+        floor = self.floor()
+        for term, count in counts.items():
+            if term in self.counts:
+                self.counts[term] += count
+            else:
+                self.counts[term] = floor + count
+                self.errors[term] = floor
+        self._truncate()
+
+    def merge(self, other):
+        floor, other_floor = self.floor(), other.floor()
+        for term in self.counts.keys() - other.counts.keys():
+            self.counts[term] += other_floor
+            self.errors[term] += other_floor
+        for term, count in other.counts.items():
+            self.counts[term] = self.counts.get(term, floor) + count
+            self.errors[term] = self.errors.get(term, floor) + other.errors[term]
+        self._truncate()
+
+    def top(self, limit=None):
+        """(term, count, error) by count, largest first"""
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(term, count, self.errors[term]) for term, count in ranked[:limit]]
+
+
+class WordSketch:
+    """Count-Min Sketch and Space-Saving summary over the same word stream"""
+
+    def __init__(self, cms=None, heavy=None, total=0):
+        self.cms = cms or CountMinSketch.from_error()
+        self.heavy = heavy or SpaceSaving()
+        self.total = total
+
+    def add(self, counts):
+        self.cms.add(counts)
+        self.heavy.add(counts)
+        self.total += sum(counts.values())
+
+    def merge(self, other):
+        self.cms.merge(other.cms)
+        self.heavy.merge(other.heavy)
+        self.total += other.total
+
+    def estimate(self, term):
+        """Estimated count of a term, never below its true count"""
+        estimate = self.cms.estimates([term])[0]
+        if term in self.heavy.counts:
+            estimate = min(estimate, self.heavy.counts[term])
+        return estimate
+
+    def top(self, limit=20):
+        """Heaviest words as (word, estimated count), largest first
+
+        Both structures overestimate, so the smaller of the two counts is
+        the tighter estimate.
+        """
+        candidates = self.heavy.top()
+        estimates = self.cms.estimates([term for term, _, _ in candidates])
+        ranked = [(term, min(count, estimate))
+                  for (term, count, _), estimate in zip(candidates, estimates)]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def error_bounds(self):
+        """Worst-case overcount of the sketch (with its probability) and of the top-k"""
+        return {
+            'total': self.total,
+            'max_overcount': math.ceil(math.e / self.cms.width * self.total),
+            'confidence': round(1 - math.exp(-self.cms.depth), 4),
+            'top_k': self.heavy.capacity,
+            'top_k_max_overcount': self.heavy.floor()
+        }
+
+    def to_bytes(self):
+        heavy = json.dumps([[term, count, self.heavy.errors[term]]
+                            for term, count in self.heavy.counts.items()]).encode('utf-8')
+        header = _HEADER.pack(self.cms.width, self.cms.depth, self.heavy.capacity,
+                              self.total, len(heavy))
+        return zlib.compress(header + heavy + self.cms.table.astype('<i8').tobytes(), 1)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        raw = zlib.decompress(blob)
+        width, depth, capacity, total, heavy_size = _HEADER.unpack_from(raw)
+        offset = _HEADER.size
+        heavy = SpaceSaving(capacity)
+        for term, count, error in json.loads(raw[offset:offset + heavy_size]):
+            heavy.counts[term] = count
+            heavy.errors[term] = error
+        table = np.frombuffer(raw, dtype='<i8', offset=offset + heavy_size)
+        table = table.astype(np.int64).reshape(depth, width)
+        return cls(CountMinSketch(width, depth, table), heavy, total)
+
+
+def post_words(post):
+    """Word counts of a post's title and selftext, stop words left out"""
+    return Counter(tokenize(f"{post['title']} {post['selftext'] or ''}", stop_words=STOP_WORDS,
+                            min_length=0, pattern=ALPHA_WORD_RE))
+
+
+def _stored_ids(conn, ids):
+    return {row[0] for row in db.select_in(conn, 'SELECT id FROM reddit_posts '
+                                                 'WHERE id IN ({ids})', ids)}
+
+
+def _word_counts_by_day(posts, subreddit=None):
+    """{(subreddit key, day): Counter}, including the '*' rows"""
+    counts = defaultdict(Counter)
+    for post in posts:
+        words = post_words(post)
+        if not words:
+            continue
+        day = int(post['created_utc'] or 0) // SECONDS_PER_DAY
+        name = (post.get('subreddit') or subreddit or '').lower()
+        counts[(name, day)].update(words)
+        counts[(ALL_SUBREDDITS, day)].update(words)
+    return counts
+
+
+def _write(conn, counts, now):
+    """Fold {(subreddit, day): Counter} into the stored rows"""
+    rows = []
+    for (name, day), words in counts.items():
+        row = conn.execute('SELECT sketch FROM word_sketches WHERE subreddit = ? AND day = ?',
+                           (name, day)).fetchone()
+        sketch = WordSketch.from_bytes(row[0]) if row else WordSketch()
+        sketch.add(words)
+        rows.append((name, day, sketch.total, sketch.to_bytes(), now))
+    conn.executemany(UPSERT_SKETCH_SQL, rows)
+    return len(rows)
+
+
+def apply_posts(conn, posts, subreddit=None):
+    """Count the words of posts not in reddit_posts yet into word_sketches
+
+    The caller holds the write lock (db.begin_immediate) and commits.
+    """
+    posts = list({str(post['id']): post for post in posts}.values())
+    stored = _stored_ids(conn, [str(post['id']) for post in posts])
+    new_posts = [post for post in posts if str(post['id']) not in stored]
+    return _write(conn, _word_counts_by_day(new_posts, subreddit), time.time())
+
+
+def top_words(subreddit=None, days=None, limit=20, now=None):
+    """Approximate top words of a subreddit (or all of them) over the last `days` days
+
+    Returns the merged ranking and its error bounds; days=None covers
+    everything stored.
+    """
+    clauses, params = ['subreddit = ?'], [(subreddit or ALL_SUBREDDITS).lower()]
+    if days:
+        now = time.time() if now is None else now
+        clauses.append('day > ?')
+        params.append(int(now) // SECONDS_PER_DAY - days)
+    rows = db.get_connection().execute(
+        f'SELECT sketch FROM word_sketches WHERE {" AND ".join(clauses)}', params)
+
+    merged = None
+    sketches = 0
+    for (blob,) in rows:
+        sketch = WordSketch.from_bytes(blob)
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+        sketches += 1
+    merged = merged or WordSketch()
+    return {
+        'top_words': merged.top(limit),
+        'sketches_merged': sketches,
+        'error_bounds': merged.error_bounds()
+    }
+
+
+def rebuild(batch_size=5000):
+    """Recompute word_sketches from reddit_posts, one subreddit at a time"""
+    start = time.perf_counter()
+    conn = db.get_connection()
+    read = db.connect()
+    try:
+        with conn:
+            conn.execute('DELETE FROM word_sketches')
+        cursor = read.execute('SELECT id, subreddit, title, selftext, created_utc '
+                              'FROM reddit_posts ORDER BY subreddit COLLATE NOCASE, created_utc')
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            posts = [{'id': row[0], 'subreddit': row[1], 'title': row[2], 'selftext': row[3],
+                      'created_utc': row[4]} for row in batch]
+            with conn:
+                _write(conn, _word_counts_by_day(posts), time.time())
+    finally:
+        read.close()
+    rows = conn.execute('SELECT COUNT(*) FROM word_sketches').fetchone()[0]
+    return {'rows_written': rows,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the word_sketches table')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help='recompute every sketch from reddit_posts')
+    args = parser.parse_args()
+
+    from storage import init_db
+    init_db()
+    if args.command == 'rebuild':
+        result = rebuild()
+        print(f"Wrote {result['rows_written']} sketch rows in {result['elapsed_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Post sources for the analysis pipeline.
+Every source yields normalized post records (the reddit_posts columns as a
+dict), so analysis can run against live Reddit or recorded data alike.
+
+Record a fixture for offline runs:
+    python sources.py record python --limit 500 --out fixtures/python.jsonl
+"""
+
+import argparse
+import json
+import os
+
+import db
+from ratelimit import limiter as rate_limiter
+
+# JSONL file or export directory served by the 'replay' source; without it
+# 'replay' reads reddit_posts
+REPLAY_PATH = os.environ.get('REPLAY_PATH')
+
+SELFTEXT_MAX_CHARS = 500
+
+
+def normalize_submission(post, subreddit):
+    """Turn a PRAW submission into a post record"""
+    return {
+        'id': post.id,
+        'subreddit': subreddit,
+        'title': post.title,
+        'author': str(post.author),
+        'score': post.score,
+        'num_comments': post.num_comments,
+        'created_utc': post.created_utc,
+        'url': post.url,
+        'selftext': post.selftext[:SELFTEXT_MAX_CHARS] if post.selftext else ''
+    }
+
+
+def normalize_record(record, subreddit=None):
+    """Fill in defaults for a stored or recorded post"""
+    return {
+        'id': str(record['id']),
+        'subreddit': record.get('subreddit') or subreddit,
+        'title': record.get('title') or '',
+        'author': str(record.get('author')),
+        'score': int(record.get('score') or 0),
+        'num_comments': int(record.get('num_comments') or 0),
+        'created_utc': float(record.get('created_utc') or 0),
+        'url': record.get('url') or '',
+        'selftext': (record.get('selftext') or '')[:SELFTEXT_MAX_CHARS]
+    }
+
+
+class PostSource:
+    """Base class for anything that yields post records for a subreddit.
+
+    sort is 'hot' (source's natural ranking) or 'new' (newest first).
+    persist tells the caller whether fetched posts should be written back
+    to reddit_posts.
+    """
+
+    name = None
+    persist = True
+
+    def iter_posts(self, subreddit, limit=100, sort='hot'):
+        raise NotImplementedError
+
+
+class RedditSource(PostSource):
+    """Live posts through the shared PRAW client"""
+
+    name = 'reddit'
+
+    def __init__(self, checkout=None):
+        if checkout is None:
+            from reddit_client import get_reddit_client as checkout
+        self.checkout = checkout
+
+    def iter_posts(self, subreddit, limit=100, sort='hot'):
+        # The client stays checked out to this listing until it is exhausted or closed
+        with self.checkout() as reddit:
+            listing = iter(getattr(reddit.subreddit(subreddit), sort)(limit=limit))
+            while True:
+                # Requests made while paging are queued under this subreddit
+                previous = rate_limiter.set_key(subreddit.lower())
+                try:
+                    post = next(listing, None)
+                finally:
+                    rate_limiter.set_key(previous)
+                if post is None:
+                    break
+                yield normalize_submission(post, subreddit)
+
+
+class JsonlReplaySource(PostSource):
+    """Recorded posts from a JSONL file, one record per line.
+
+    Records for other subreddits are skipped; a subreddit of '*' replays
+    everything. 'hot' keeps file order, 'new' sorts by created_utc (which
+    loads the matching records into memory).
+    """
+
+    name = 'replay'
+
+    def __init__(self, path):
+        self.path = path
+
+    def _records(self, subreddit):
+        wanted = subreddit.lower()
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record_sub = (record.get('subreddit') or '').lower()
+                if wanted == '*' or not record_sub or record_sub == wanted:
+                    yield normalize_record(record, subreddit)
+
+    def iter_posts(self, subreddit, limit=100, sort='hot'):
+        records = self._records(subreddit)
+        if sort == 'new':
+            records = iter(sorted(records, key=lambda p: p['created_utc'], reverse=True))
+        for i, record in enumerate(records):
+            if i >= limit:
+                break
+            yield record
+
+
+class DbReplaySource(PostSource):
+    """Posts already stored in reddit_posts, streamed with a cursor"""
+
+    name = 'db'
+    persist = False
+
+    ORDER_BY = {'hot': 'score DESC', 'new': 'created_utc DESC'}
+    COLUMNS = ('id', 'subreddit', 'title', 'author', 'score', 'num_comments',
+               'created_utc', 'url', 'selftext')
+
+    def iter_posts(self, subreddit, limit=100, sort='hot'):
+        sql = f'SELECT {", ".join(self.COLUMNS)} FROM reddit_posts'
+        params = []
+        if subreddit != '*':
+            sql += ' WHERE subreddit = ? COLLATE NOCASE'
+            params.append(subreddit)
+        sql += f' ORDER BY {self.ORDER_BY[sort]} LIMIT ?'
+        params.append(limit)
+
+        # A dedicated connection, so the consumer can write while we iterate
+        conn = db.connect()
+        try:
+            for row in conn.execute(sql, params):
+                yield normalize_record(dict(zip(self.COLUMNS, row)))
+        finally:
+            conn.close()
+
+
+class ArrowReplaySource(PostSource):
+    """Posts from a Parquet / Arrow IPC export directory (see export.py).
+
+    Partitions are read one at a time, keeping the latest copy of posts
+    exported more than once. 'hot' goes through the partitions in path
+    order, highest score first within each; 'new' goes newest day first,
+    reading one day's partitions at a time.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path):
+        self.path = path
+
+    def _tables(self, subreddit, sort):
+        import export
+        found = list(export.partitions(self.path, subreddit))
+        if sort == 'new':
+            days = {}
+            for name, date, files in found:
+                days.setdefault(date, []).append((name, files))
+            for date in sorted(days, reverse=True):
+                yield [(name, export.read_partition(files)) for name, files in days[date]]
+        else:
+            for name, date, files in found:
+                yield [(name, export.read_partition(files))]
+
+    def iter_posts(self, subreddit, limit=100, sort='hot'):
+        key = 'created_utc' if sort == 'new' else 'score'
+        count = 0
+        for tables in self._tables(subreddit, sort):
+            if count >= limit:
+                return
+            records = [normalize_record(row, name)
+                       for name, table in tables for row in table.to_pylist()]
+            records.sort(key=lambda p: p[key], reverse=True)
+            for record in records:
+                if count >= limit:
+                    return
+                count += 1
+                yield record
+
+
+def get_source(name):
+    """Look up a source by name ('reddit', 'replay' or 'db'); None if unknown"""
+    if name == 'reddit':
+        return RedditSource()
+    if name == 'replay':
+        if not REPLAY_PATH:
+            return DbReplaySource()
+        if os.path.isdir(REPLAY_PATH):
+            return ArrowReplaySource(REPLAY_PATH)
+        return JsonlReplaySource(REPLAY_PATH)
+    if name == 'db':
+        return DbReplaySource()
+    return None
+
+
+def write_jsonl(posts, path):
+    """Write post records to a JSONL file; returns how many were written"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for post in posts:
+            f.write(json.dumps(post) + '\n')
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record posts to a JSONL replay fixture')
+    sub = parser.add_subparsers(dest='command', required=True)
+    record = sub.add_parser('record', help='fetch posts from a source and write them as JSONL')
+    record.add_argument('subreddit')
+    record.add_argument('--source', default='reddit')
+    record.add_argument('--sort', default='hot', choices=('hot', 'new'))
+    record.add_argument('--limit', type=int, default=100)
+    record.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    source = get_source(args.source)
+    if source is None:
+        parser.error(f'unknown source {args.source!r}')
+    count = write_jsonl(source.iter_posts(args.subreddit, args.limit, args.sort), args.out)
+    print(f'Wrote {count} posts to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
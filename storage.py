@@ -0,0 +1,230 @@
+"""
+Schema and persistence helpers for the analytics database.
+"""
+
+import json
+import time
+from datetime import datetime
+
+import db
+from cursors import decode_cursor, encode_cursor
+from features import init_features_schema, save_features
+from minhash import init_minhash_schema, save_signatures
+from rollups import apply_post_deltas, init_rollups_schema
+from search import init_search_schema
+from sketches import apply_posts as apply_word_sketches, init_sketches_schema
+
+
+# Database setup
+def init_db():
+    """Initialize SQLite database"""
+    conn = db.get_connection()
+    c = conn.cursor()
+
+    c.execute('''CREATE TABLE IF NOT EXISTS reddit_posts
+                 (id TEXT PRIMARY KEY,
+                  subreddit TEXT,
+                  title TEXT,
+                  author TEXT,
+                  score INTEGER,
+                  num_comments INTEGER,
+                  created_utc INTEGER,
+                  url TEXT,
+                  selftext TEXT,
+                  fetched_at TIMESTAMP)''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS analytics
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  source TEXT,
+                  query TEXT,
+                  total_posts INTEGER,
+                  avg_score REAL,
+                  top_words TEXT,
+                  created_at TIMESTAMP)''')
+
+    # Per-subreddit watermark and running aggregate for incremental analysis
+    c.execute('''CREATE TABLE IF NOT EXISTS subreddit_state
+                 (subreddit TEXT PRIMARY KEY,
+                  watermark REAL,
+                  watermark_ids TEXT,
+                  aggregate TEXT,
+                  updated_at TIMESTAMP)''')
+
+    # Keyset pagination for /history and time-ordered reads per subreddit
+    c.execute('CREATE INDEX IF NOT EXISTS idx_analytics_created_at '
+              'ON analytics (created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_analytics_query_created_at '
+              'ON analytics (query, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_reddit_posts_subreddit_created_utc '
+              'ON reddit_posts (subreddit COLLATE NOCASE, created_utc)')
+
+    # Derived per-post features, refreshed whenever a post is written
+    init_features_schema(conn)
+    # Per (subreddit, day, hour) totals, updated with deltas as posts are written
+    init_rollups_schema(conn)
+    # FTS5 index over title and selftext, kept in sync by triggers
+    init_search_schema(conn)
+    # Approximate word counts per (subreddit, day), mergeable across both
+    init_sketches_schema(conn)
+    # MinHash signatures and LSH buckets for near-duplicate lookups
+    init_minhash_schema(conn)
+
+    conn.commit()
+
+
+# An upsert rather than INSERT OR REPLACE: a replace deletes the old row
+# without firing delete triggers, which would leave post_search stale
+INSERT_POST_SQL = '''INSERT INTO reddit_posts
+                     (id, subreddit, title, author, score, num_comments,
+                      created_utc, url, selftext, fetched_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT (id) DO UPDATE SET
+                       subreddit = excluded.subreddit,
+                       title = excluded.title,
+                       author = excluded.author,
+                       score = excluded.score,
+                       num_comments = excluded.num_comments,
+                       created_utc = excluded.created_utc,
+                       url = excluded.url,
+                       selftext = excluded.selftext,
+                       fetched_at = excluded.fetched_at'''
+
+
+def _post_row(post_data, subreddit, fetched_at):
+    """Build the reddit_posts row tuple for a post"""
+    return (post_data['id'], post_data.get('subreddit') or subreddit, post_data['title'],
+            post_data['author'], post_data['score'],
+            post_data['num_comments'], post_data['created_utc'],
+            post_data['url'], post_data['selftext'],
+            fetched_at)
+
+
+def save_post(post_data, subreddit):
+    """Save post and its derived features to database"""
+    conn = db.get_connection()
+
+    try:
+        with conn:
+            db.begin_immediate(conn)
+            apply_post_deltas(conn, [post_data], subreddit)
+            apply_word_sketches(conn, [post_data], subreddit)
+            conn.execute(INSERT_POST_SQL, _post_row(post_data, subreddit, datetime.now()))
+            save_features(conn, [post_data])
+            save_signatures(conn, [post_data], subreddit)
+    except Exception as e:
+        print(f"Error saving post: {e}")
+
+
+def save_posts(posts, subreddit):
+    """Save a batch of posts and their derived features in a single transaction
+
+    Returns the number of rows written and the time spent in milliseconds.
+    """
+    start = time.perf_counter()
+    fetched_at = datetime.now()
+    rows = [_post_row(post_data, subreddit, fetched_at) for post_data in posts]
+    rows_written = 0
+
+    conn = db.get_connection()
+    try:
+        with conn:
+            # Rollups and sketches diff against the stored rows, so they go before the
+            # upsert, with the write lock already held so no other save slips in between
+            db.begin_immediate(conn)
+            apply_post_deltas(conn, posts, subreddit)
+            apply_word_sketches(conn, posts, subreddit)
+            conn.executemany(INSERT_POST_SQL, rows)
+            save_features(conn, posts)
+            save_signatures(conn, posts, subreddit)
+        rows_written = len(rows)
+    except Exception as e:
+        print(f"Error saving posts: {e}")
+
+    return {
+        'rows_written': rows_written,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    }
+
+
+def load_subreddit_state(state_key):
+    """Load the incremental watermark and stored aggregate for a subreddit
+
+    Returns None if the subreddit has never been analyzed incrementally.
+    """
+    conn = db.get_connection()
+    row = conn.execute('SELECT watermark, watermark_ids, aggregate FROM subreddit_state '
+                       'WHERE subreddit = ?', (state_key,)).fetchone()
+    if row is None:
+        return None
+    return {'watermark': row[0], 'watermark_ids': json.loads(row[1]),
+            'aggregate': json.loads(row[2])}
+
+
+def save_subreddit_state(state_key, watermark, watermark_ids, aggregate):
+    """Persist the incremental watermark and aggregate (a JSON-able dict)"""
+    conn = db.get_connection()
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO subreddit_state '
+                     '(subreddit, watermark, watermark_ids, aggregate, updated_at) '
+                     'VALUES (?, ?, ?, ?, ?)',
+                     (state_key, watermark, json.dumps(watermark_ids),
+                      json.dumps(aggregate), datetime.now()))
+
+
+def save_analysis(source, query, result):
+    """Record one analysis run in analytics"""
+    conn = db.get_connection()
+    try:
+        with conn:
+            conn.execute('INSERT INTO analytics '
+                         '(source, query, total_posts, avg_score, top_words, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         (source, query.lower(), result['total_posts'], result['avg_score'],
+                          json.dumps(result['top_words']), datetime.now()))
+    except Exception as e:
+        print(f"Error saving analysis: {e}")
+
+
+HISTORY_COLUMNS = ('id', 'source', 'query', 'total_posts', 'avg_score', 'top_words', 'created_at')
+
+
+def load_history(query=None, since=None, until=None, cursor=None, limit=10):
+    """One page of analysis runs, newest first
+
+    since and until bound created_at (epoch seconds, until exclusive);
+    they are compared in the local time save_analysis stores. Pages
+    are keyset-paginated on (created_at, id), so each page costs the same
+    however deep it is. Returns (rows, next_cursor); next_cursor is None on
+    the last page.
+    """
+    clauses, params = [], []
+    if query:
+        clauses.append('query = ?')
+        params.append(query.lower())
+    if since is not None:
+        clauses.append('created_at >= ?')
+        params.append(str(datetime.fromtimestamp(since)))
+    if until is not None:
+        clauses.append('created_at < ?')
+        params.append(str(datetime.fromtimestamp(until)))
+    if cursor:
+        clauses.append('(created_at, id) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    sql = f'SELECT {", ".join(HISTORY_COLUMNS)} FROM analytics'
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    params.append(limit + 1)
+
+    rows = db.get_connection().execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][6], rows[-1][0])
+
+    history = []
+    for row in rows:
+        entry = dict(zip(HISTORY_COLUMNS, row))
+        entry['top_words'] = json.loads(entry['top_words']) if entry['top_words'] else []
+        history.append(entry)
+    return history, next_cursor
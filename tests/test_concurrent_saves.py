@@ -0,0 +1,67 @@
+"""
+Concurrent saves of the same posts must leave the derived tables as a
+rebuild from reddit_posts would.
+
+    python -m pytest -q tests
+"""
+
+import threading
+
+import db
+import rollups
+import sketches
+import storage
+
+WRITERS = 4
+
+
+def _posts():
+    return [{'id': f'p{i}', 'subreddit': 'python', 'title': f'concurrent writers post {i}',
+             'author': 'someone', 'score': 10 * (i + 1), 'num_comments': i,
+             'created_utc': 1717200000 + 3600 * i, 'url': '', 'selftext': 'same body text'}
+            for i in range(5)]
+
+
+def _save_concurrently(posts):
+    barrier = threading.Barrier(WRITERS)
+    results = []
+
+    def save():
+        barrier.wait()
+        try:
+            results.append(storage.save_posts(posts, 'python'))
+        finally:
+            db.release_connection()
+
+    threads = [threading.Thread(target=save) for _ in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _table(conn, sql):
+    return conn.execute(sql).fetchall()
+
+
+def test_concurrent_saves_match_rebuild(tmp_path):
+    db.configure(str(tmp_path / 'analytics.db'))
+    storage.init_db()
+    posts = _posts()
+
+    results = _save_concurrently(posts)
+    assert [result['rows_written'] for result in results] == [len(posts)] * WRITERS
+
+    conn = db.get_connection()
+    rollup_sql = 'SELECT * FROM hourly_rollups ORDER BY subreddit, day, hour'
+    sketch_sql = 'SELECT subreddit, day, total FROM word_sketches ORDER BY subreddit, day'
+    saved_rollups = _table(conn, rollup_sql)
+    saved_sketches = _table(conn, sketch_sql)
+    assert sum(row[3] for row in saved_rollups) == len(posts)
+
+    rollups.rebuild()
+    sketches.rebuild()
+    assert _table(conn, rollup_sql) == saved_rollups
+    assert _table(conn, sketch_sql) == saved_sketches
+    db.close_all()
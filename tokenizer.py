@@ -0,0 +1,118 @@
+"""
+Shared tokenizer for keyword, word-frequency and phrase helpers.
+Patterns are compiled once at import and stop-word sets are frozen, so a
+text is lowercased and scanned exactly once to get its keywords and n-grams.
+"""
+
+import re
+from collections import Counter
+
+# Runs of letters/digits (what str.isalnum splitting gives)
+WORD_RE = re.compile(r'[^\W_]+')
+# Whole lowercase words of 3+ letters, as used by the analysis pipeline
+ALPHA_WORD_RE = re.compile(r'\b[a-z]{3,}\b')
+# Runs of ASCII letters, ignoring digits in between
+LETTER_RUN_RE = re.compile(r'[a-z]+')
+
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'if', 'then', 'else', 'when', 'at', 'from', 'by',
+    'for', 'with', 'about', 'against', 'between', 'into', 'through', 'during', 'before',
+    'after', 'above', 'below', 'to', 'of', 'in', 'on', 'off', 'over', 'under', 'up', 'down',
+    'out', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do',
+    'does', 'did', 'this', 'that', 'these', 'those', 'it', 'its', 'they', 'them', 'their',
+    'we', 'us', 'our', 'i', 'me', 'my', 'you', 'your', 'he', 'him', 'his', 'she', 'her',
+    'how', 'what', 'which', 'who', 'whom', 'where', 'why', 'can', 'will', 'just', 'not',
+    'no', 'nor', 'so', 'than', 'too', 'very', 'all', 'any', 'more', 'most', 'some', 'such'
+})
+
+NO_STOP_WORDS = frozenset()
+
+
+def tokenize(text, stop_words=NO_STOP_WORDS, min_length=3, pattern=WORD_RE):
+    """Lowercase and split text into tokens, dropping stop words and short tokens"""
+    if not text:
+        return []
+    if not stop_words and min_length <= 1:
+        return pattern.findall(text.lower())
+    return [w for w in pattern.findall(text.lower())
+            if len(w) >= min_length and w not in stop_words]
+
+
+def analyze_text(text, stop_words=NO_STOP_WORDS, min_length=3, n=2, pattern=WORD_RE):
+    """Scan text once and return (keywords, ngrams)
+
+    N-grams are built from every token of min_length or more, before stop
+    words are removed, so phrases like 'state of the art' survive intact.
+    """
+    if not text:
+        return [], []
+    words = pattern.findall(text.lower())
+    if min_length > 1:
+        words = [w for w in words if len(w) >= min_length]
+    keywords = [w for w in words if w not in stop_words] if stop_words else words
+    if n and len(words) >= n:
+        ngrams = list(map(' '.join, zip(*[words[i:] for i in range(n)])))
+    else:
+        ngrams = []
+    return keywords, ngrams
+
+
+class TextScan:
+    """Keyword and n-gram counts accumulated over many texts"""
+
+    def __init__(self, stop_words=NO_STOP_WORDS, min_length=3, n=2, pattern=WORD_RE):
+        self.stop_words = stop_words
+        self.min_length = min_length
+        self.n = n
+        self.pattern = pattern
+        self.texts = 0
+        self.tokens = 0
+        self.word_counts = Counter()
+        self.ngram_counts = Counter()
+
+    def add(self, text):
+        """Count one text's keywords and n-grams; returns them as well"""
+        keywords, ngrams = analyze_text(text, self.stop_words, self.min_length, self.n, self.pattern)
+        self.texts += 1
+        self.tokens += len(keywords)
+        self.word_counts.update(keywords)
+        if ngrams:
+            self.ngram_counts.update(ngrams)
+        return keywords, ngrams
+
+
+def scan(texts, stop_words=NO_STOP_WORDS, min_length=3, n=2, pattern=WORD_RE, chunk_size=4096):
+    """Count keywords and n-grams over texts in one pass; empty texts are skipped
+
+    Tokens are buffered for chunk_size texts and counted together, which is
+    much cheaper than updating the counters text by text.
+    """
+    result = TextScan(stop_words, min_length, n, pattern)
+    keywords, ngrams = [], []
+    pending = 0
+    for text in texts:
+        if not text:
+            continue
+        text_keywords, text_ngrams = analyze_text(text, stop_words, min_length, n, pattern)
+        keywords += text_keywords
+        ngrams += text_ngrams
+        result.texts += 1
+        pending += 1
+        if pending >= chunk_size:
+            _count_chunk(result, keywords, ngrams)
+            keywords, ngrams = [], []
+            pending = 0
+    _count_chunk(result, keywords, ngrams)
+    return result
+
+
+def _count_chunk(result, keywords, ngrams):
+    result.tokens += len(keywords)
+    result.word_counts.update(keywords)
+    if ngrams:
+        result.ngram_counts.update(ngrams)
+
+
+def count_words(texts, stop_words=NO_STOP_WORDS, min_length=3, pattern=WORD_RE):
+    """Keyword counts over texts (no n-grams)"""
+    return scan(texts, stop_words, min_length, 0, pattern).word_counts
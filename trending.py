@@ -0,0 +1,238 @@
+"""
+Sliding-window trending terms per subreddit.
+
+Post titles are counted into time buckets (by created_utc) held in a ring
+per subreddit: the most recent TRENDING_WINDOW seconds form the current
+window and the TRENDING_BASELINE seconds before it the baseline. Running
+totals for both spans are adjusted as posts arrive and as buckets age from
+one span into the next, so asking for the top rising terms only looks at
+the terms in the current window and never rescans history.
+
+A term's burst score compares its count in the window with what the
+baseline rate predicts for the window's volume:
+
+    expected = baseline_count * window_total / baseline_total
+    score = (count - expected) / sqrt(expected)
+
+expected is floored at MIN_EXPECTED so terms unseen in the baseline don't
+divide by zero. Each post counts a term or bigram once, however often its
+title repeats it, and a post id is only counted once per ring.
+
+The first request for a subreddit the process hasn't seen posts for loads
+the ring from the posts stored in reddit_posts.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+import db
+from tokenizer import STOP_WORDS, WORD_RE, analyze_text
+
+TRENDING_BUCKET_SECONDS = int(os.environ.get('TRENDING_BUCKET_SECONDS', 300))
+TRENDING_WINDOW = int(os.environ.get('TRENDING_WINDOW', 3600))
+TRENDING_BASELINE = int(os.environ.get('TRENDING_BASELINE', 86400))
+
+# Window count a term needs before it can trend
+MIN_COUNT = 3
+# Smallest expected count used in the burst score
+MIN_EXPECTED = 1.0
+
+
+def title_terms(title):
+    """Distinct keywords and bigrams of a title, stop words and short words left out"""
+    words, bigrams = analyze_text(title, min_length=1, n=2, pattern=WORD_RE)
+    terms = {w for w in words if len(w) >= 3 and w not in STOP_WORDS and not w.isdigit()}
+    terms.update(b for b in bigrams if all(w in terms for w in b.split(' ')))
+    return terms
+
+
+class _Span:
+    """Running term counts over a run of buckets"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.terms = 0
+        self.posts = 0
+
+    def add(self, counts, posts):
+        self.counts.update(counts)
+        self.terms += sum(counts.values())
+        self.posts += posts
+
+    def remove(self, counts, posts):
+        for term, count in counts.items():
+            left = self.counts[term] - count
+            if left > 0:
+                self.counts[term] = left
+            else:
+                del self.counts[term]
+        self.terms -= sum(counts.values())
+        self.posts -= posts
+
+
+class _Ring:
+    """Bucketed counts for one subreddit; idx is a bucket number since the epoch"""
+
+    def __init__(self):
+        self.buckets = {}      # idx -> Counter of terms
+        self.post_ids = {}     # idx -> post ids counted in that bucket
+        self.seen = set()
+        self.window = _Span()
+        self.baseline = _Span()
+        self.head = None
+
+
+class TrendingTracker:
+    """Incremental term and bigram burst scores per subreddit
+
+    add(post) folds one post in; top(subreddit) ranks the terms of the
+    current window. clock gives the current time in epoch seconds.
+    """
+
+    def __init__(self, bucket_seconds=TRENDING_BUCKET_SECONDS, window=TRENDING_WINDOW,
+                 baseline=TRENDING_BASELINE, clock=time.time, loader=None):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = max(window // bucket_seconds, 1)
+        self.baseline_buckets = max(baseline // bucket_seconds, 1)
+        self.clock = clock
+        self.loader = loader or load_recent_posts
+        self._rings = {}
+        self._loaded = set()
+        # Reentrant: a first-use load holds it while add() takes it per post
+        self._lock = threading.RLock()
+
+    @property
+    def horizon(self):
+        """Buckets kept per subreddit"""
+        return self.window_buckets + self.baseline_buckets
+
+    def _bucket(self, timestamp):
+        return int(timestamp // self.bucket_seconds)
+
+    def _advance(self, ring, now_idx):
+        """Age buckets out of the window and off the end of the ring up to now_idx"""
+        if ring.head is not None and now_idx <= ring.head:
+            return
+        if ring.head is None or now_idx - ring.head >= self.horizon:
+            # Nothing carries over; drop or re-sort whatever is left
+            for idx in [idx for idx in ring.buckets if idx <= now_idx - self.horizon]:
+                self._drop(ring, idx)
+            ring.window, ring.baseline = _Span(), _Span()
+            for idx, counts in ring.buckets.items():
+                span = ring.window if idx > now_idx - self.window_buckets else ring.baseline
+                span.add(counts, len(ring.post_ids[idx]))
+        else:
+            for idx in range(ring.head - self.window_buckets + 1,
+                             now_idx - self.window_buckets + 1):
+                if idx in ring.buckets:
+                    posts = len(ring.post_ids[idx])
+                    ring.window.remove(ring.buckets[idx], posts)
+                    ring.baseline.add(ring.buckets[idx], posts)
+            for idx in range(ring.head - self.horizon + 1, now_idx - self.horizon + 1):
+                if idx in ring.buckets:
+                    ring.baseline.remove(ring.buckets[idx], len(ring.post_ids[idx]))
+                    self._drop(ring, idx)
+        ring.head = now_idx
+
+    def _drop(self, ring, idx):
+        del ring.buckets[idx]
+        ring.seen.difference_update(ring.post_ids.pop(idx))
+
+    def _ring(self, subreddit):
+        ring = self._rings.get(subreddit)
+        if ring is None:
+            ring = self._rings[subreddit] = _Ring()
+        self._advance(ring, self._bucket(self.clock()))
+        return ring
+
+    def add(self, post, subreddit=None):
+        """Count a post's title terms; returns False if it is too old or already counted"""
+        key = (post.get('subreddit') or subreddit or '').lower()
+        terms = dict.fromkeys(title_terms(post['title']), 1)
+        with self._lock:
+            ring = self._ring(key)
+            post_id = str(post['id'])
+            idx = min(self._bucket(post['created_utc'] or 0), ring.head)
+            if idx <= ring.head - self.horizon or post_id in ring.seen:
+                return False
+            ring.seen.add(post_id)
+            ring.buckets.setdefault(idx, Counter()).update(terms)
+            ring.post_ids.setdefault(idx, []).append(post_id)
+            span = ring.window if idx > ring.head - self.window_buckets else ring.baseline
+            span.add(terms, 1)
+        return True
+
+    def add_many(self, posts, subreddit=None):
+        """Count several posts; returns how many were new"""
+        return sum(self.add(post, subreddit) for post in posts)
+
+    def _ensure_loaded(self, subreddit):
+        """Load subreddit's stored posts on first use; concurrent callers wait for it"""
+        if subreddit in self._loaded:
+            return
+        with self._lock:
+            if subreddit in self._loaded:
+                return
+            since = (self._bucket(self.clock()) - self.horizon + 1) * self.bucket_seconds
+            self.add_many(self.loader(subreddit, since), subreddit)
+            # Marked only once loaded, so a failed load is retried
+            self._loaded.add(subreddit)
+
+    def top(self, subreddit, limit=20, kind='all', min_count=MIN_COUNT):
+        """Top rising terms in subreddit's current window, highest burst score first
+
+        kind is 'terms' (single words), 'phrases' (bigrams) or 'all'.
+        """
+        key = subreddit.lower()
+        self._ensure_loaded(key)
+        with self._lock:
+            ring = self._ring(key)
+            baseline = ring.baseline.counts
+            scale = ring.window.terms / ring.baseline.terms if ring.baseline.terms else 0.0
+            scored = []
+            for term, count in ring.window.counts.items():
+                if count < min_count:
+                    continue
+                is_phrase = ' ' in term
+                if (kind == 'terms' and is_phrase) or (kind == 'phrases' and not is_phrase):
+                    continue
+                expected = max(baseline.get(term, 0) * scale, MIN_EXPECTED)
+                scored.append(((count - expected) / math.sqrt(expected), term, count, expected))
+            window_posts, baseline_posts = ring.window.posts, ring.baseline.posts
+
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+        return {
+            'subreddit': key,
+            'window_posts': window_posts,
+            'baseline_posts': baseline_posts,
+            'terms': [{'term': term, 'count': count, 'expected': round(expected, 2),
+                       'ratio': round(count / expected, 2), 'score': round(score, 2)}
+                      for score, term, count, expected in scored[:limit] if score > 0]
+        }
+
+    def stats(self):
+        with self._lock:
+            rings = list(self._rings.values())
+            return {
+                'subreddits': len(rings),
+                'buckets': sum(len(ring.buckets) for ring in rings),
+                'posts': sum(len(ring.seen) for ring in rings),
+                'window_terms': sum(len(ring.window.counts) for ring in rings),
+                'baseline_terms': sum(len(ring.baseline.counts) for ring in rings)
+            }
+
+
+def load_recent_posts(subreddit, since):
+    """Stored posts of subreddit created at or after since"""
+    rows = db.get_connection().execute(
+        'SELECT id, subreddit, title, created_utc FROM reddit_posts '
+        'WHERE subreddit = ? COLLATE NOCASE AND created_utc >= ?', (subreddit, since))
+    for post_id, name, title, created_utc in rows:
+        yield {'id': post_id, 'subreddit': name, 'title': title, 'created_utc': created_utc}
+
+
+# Fed by the analysis pipeline with every post it writes
+tracker = TrendingTracker()
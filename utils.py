@@ -1,3 +1,5 @@
+from sentiment import engine as sentiment_engine
+
 # Add a text preprocessing helper to filter out common stop words for more meaningful word frequency analysis.
 def filter_stop_words(text):
     import re
@@ -113,13 +115,14 @@ def clean_text(text):
 
 # AI Improvement (2026-02-27)
 # Add a basic sentiment analysis helper to categorize post titles.
+sentiment_engine.add_lexicon(
+    'utils.analyze_sentiment',
+    {'great', 'awesome', 'excellent', 'happy', 'good', 'best', 'cool', 'love', 'amazing', 'useful', 'helpful'},
+    {'bad', 'terrible', 'awful', 'horrible', 'worst', 'sad', 'hate', 'poor', 'annoying', 'wrong', 'broken'})
+
 def analyze_sentiment(text):
     """Categorizes text as positive, negative, or neutral based on keyword polarity."""
-    positive_words = {'great', 'awesome', 'excellent', 'happy', 'good', 'best', 'cool', 'love', 'amazing', 'useful', 'helpful'}
-    negative_words = {'bad', 'terrible', 'awful', 'horrible', 'worst', 'sad', 'hate', 'poor', 'annoying', 'wrong', 'broken'}
-    words = str(text).lower().split()
-    score = sum(1 for word in words if word in positive_words) - sum(1 for word in words if word in negative_words)
-    return 'positive' if score > 0 else ('negative' if score < 0 else 'neutral')
+    return sentiment_engine.label(str(text), 'utils.analyze_sentiment')
 
 
 # AI Improvement (2026-02-27)
@@ -178,15 +181,16 @@ def clean_text_for_analysis(text):
 # AI Improvement (2026-02-28)
 # Add a basic lexicon-based sentiment analysis helper to estimate the emotional tone of post titles.
 
+sentiment_engine.add_lexicon(
+    'utils.calculate_sentiment_score',
+    {'great', 'amazing', 'excellent', 'good', 'love', 'helpful', 'awesome', 'best', 'perfect', 'fantastic', 'top', 'upvote'},
+    {'bad', 'terrible', 'awful', 'horrible', 'worst', 'hate', 'useless', 'boring', 'annoying', 'wrong', 'downvote'})
+
 def calculate_sentiment_score(text):
-    import re
     """Calculates a simple sentiment score (-1 to 1) based on keyword matching."""
-    positive = {'great', 'amazing', 'excellent', 'good', 'love', 'helpful', 'awesome', 'best', 'perfect', 'fantastic', 'top', 'upvote'}
-    negative = {'bad', 'terrible', 'awful', 'horrible', 'worst', 'hate', 'useless', 'boring', 'annoying', 'wrong', 'downvote'}
-    words = re.findall(r'\w+', text.lower())
-    if not words: return 0.0
-    score = sum(1 for w in words if w in positive) - sum(1 for w in words if w in negative)
-    return round(score / len(words), 4)
+    score, count = sentiment_engine.score(text, 'utils.calculate_sentiment_score')
+    if not count: return 0.0
+    return round(score / count, 4)
 
 
 # AI Improvement (2026-02-28)
@@ -264,19 +268,14 @@ def calculate_score_velocity(score, created_utc):
 # AI Improvement (2026-03-01)
 # Add a simple keyword-based sentiment analysis helper to analyze post titles or comments.
 
+sentiment_engine.add_lexicon(
+    'utils.calculate_sentiment',
+    {'awesome', 'best', 'excellent', 'good', 'great', 'love', 'cool', 'amazing', 'helpful', 'interesting'},
+    {'awful', 'bad', 'terrible', 'worst', 'hate', 'broken', 'annoying', 'poor', 'useless', 'horrible'})
+
 def calculate_sentiment(text):
     """Calculates a basic sentiment score: positive (>0), neutral (0), or negative (<0)."""
-    positive_words = {'awesome', 'best', 'excellent', 'good', 'great', 'love', 'cool', 'amazing', 'helpful', 'interesting'}
-    negative_words = {'awful', 'bad', 'terrible', 'worst', 'hate', 'broken', 'annoying', 'poor', 'useless', 'horrible'}
-    words = text.lower().split()
-    score = 0
-    for word in words:
-        clean_word = word.strip('.,!?()[]"\'')
-        if clean_word in positive_words:
-            score += 1
-        elif clean_word in negative_words:
-            score -= 1
-    return score
+    return sentiment_engine.score(text, 'utils.calculate_sentiment')[0]
 
 
 # AI Improvement (2026-03-01)
@@ -324,32 +323,24 @@ def is_valid_subreddit(name):
 
 # AI Improvement (2026-03-02)
 # Add a keyword extraction helper to identify trending topics by filtering out common stop words.
+EXTRACT_KEYWORDS_STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'to', 'for', 'in', 'on', 'at', 'by', 'of', 'with', 'it', 'its', 'this', 'that', 'from', 'how', 'what', 'why', 'can', 'not', 'if', 'your', 'my', 'with', 'about'})
+
 def extract_top_keywords(text_list, limit=10):
     """Extracts the most frequent keywords from a list of strings, excluding common English stop words."""
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'to', 'for', 'in', 'on', 'at', 'by', 'of', 'with', 'it', 'its', 'this', 'that', 'from', 'how', 'what', 'why', 'can', 'not', 'if', 'your', 'my', 'with', 'about'}
-    counts = {}
-    for text in text_list:
-        for word in text.lower().split():
-            word = ''.join(filter(str.isalnum, word))
-            if word and word not in stop_words and len(word) > 2:
-                counts[word] = counts.get(word, 0) + 1
-    return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+    from tokenizer import count_words
+    return count_words(text_list, stop_words=EXTRACT_KEYWORDS_STOP_WORDS).most_common(limit)
 
 
 # AI Improvement (2026-03-02)
 # Add a sentiment analysis utility function to classify the tone of Reddit posts.
+sentiment_engine.add_lexicon(
+    'utils.get_sentiment_label',
+    {'excellent', 'great', 'good', 'amazing', 'love', 'best', 'incredible', 'helpful', 'useful', 'awesome', 'interesting'},
+    {'terrible', 'bad', 'awful', 'worst', 'hate', 'annoying', 'broken', 'useless', 'horrible', 'disappointing', 'wrong'})
+
 def get_sentiment_label(text):
     """
     Classifies text as Positive, Negative, or Neutral based on keyword presence.
     This provides a lightweight way to gauge community reaction.
     """
-    pos_words = {'excellent', 'great', 'good', 'amazing', 'love', 'best', 'incredible', 'helpful', 'useful', 'awesome', 'interesting'}
-    neg_words = {'terrible', 'bad', 'awful', 'worst', 'hate', 'annoying', 'broken', 'useless', 'horrible', 'disappointing', 'wrong'}
-    
-    # Basic tokenization and scoring
-    tokens = text.lower().strip().split()
-    score = sum(1 for word in tokens if word in pos_words) - sum(1 for word in tokens if word in neg_words)
-    
-    if score > 0: return 'Positive'
-    if score < 0: return 'Negative'
-    return 'Neutral'
+    return sentiment_engine.label(text, 'utils.get_sentiment_label').capitalize()
@@ -1,6 +1,9 @@
 # Add a score velocity calculator to measure how fast a post is gaining points.
 import time
 
+from sentiment import engine as sentiment_engine
+from tokenizer import count_words
+
 def calculate_score_velocity(score, created_utc):
     """
     Calculates the average score gained per hour since the post was created.
@@ -163,23 +166,14 @@ def calculate_hot_score(score, num_comments, created_utc):
 
 # AI Improvement (2026-03-06)
 # Add a keyword extraction utility with stop-word filtering to improve word frequency analysis.
+TOP_KEYWORDS_STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'if', 'then', 'else', 'when', 'at', 'from', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to', 'of', 'in', 'on', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'this', 'that', 'it', 'its', 'they', 'them', 'their', 'my', 'your', 'our', 'how', 'what', 'which', 'who', 'whom', 'can', 'not', 'just', 'more', 'all', 'any'})
+
 def get_top_keywords(text_list, limit=20):
     """
     Processes a list of text strings to find the most frequent meaningful keywords.
     Filters out common English stop words and non-alphanumeric characters.
     """
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'if', 'then', 'else', 'when', 'at', 'from', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to', 'of', 'in', 'on', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'this', 'that', 'it', 'its', 'they', 'them', 'their', 'my', 'your', 'our', 'how', 'what', 'which', 'who', 'whom', 'can', 'not', 'just', 'more', 'all', 'any'}
-    
-    counts = {}
-    for text in text_list:
-        if not text: continue
-        # Remove punctuation and lowercase
-        clean_text = ''.join(c if c.isalnum() or c.isspace() else ' ' for c in text.lower())
-        for word in clean_text.split():
-            if word not in stop_words and len(word) > 2:
-                counts[word] = counts.get(word, 0) + 1
-                
-    return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+    return count_words(text_list, stop_words=TOP_KEYWORDS_STOP_WORDS).most_common(limit)
 
 
 # AI Improvement (2026-03-06)
@@ -203,29 +197,22 @@ def calculate_clickbait_score(text):
 
 # AI Improvement (2026-03-06)
 # Add a rule-based sentiment analysis utility to score post titles/content.
+sentiment_engine.add_lexicon(
+    'utils.analytics.analyze_sentiment',
+    {'amazing', 'great', 'excellent', 'good', 'positive', 'win', 'best', 'love', 'success', 'awesome'},
+    {'awful', 'terrible', 'bad', 'negative', 'loss', 'worst', 'hate', 'failure', 'horrible', 'poor'})
 
 def analyze_sentiment(text):
     """
     Analyzes the sentiment of a given text using a basic word-matching approach.
     Returns a score between -1.0 (very negative) and 1.0 (very positive).
     """
-    pos_words = {'amazing', 'great', 'excellent', 'good', 'positive', 'win', 'best', 'love', 'success', 'awesome'}
-    neg_words = {'awful', 'terrible', 'bad', 'negative', 'loss', 'worst', 'hate', 'failure', 'horrible', 'poor'}
-    
-    tokens = text.lower().split()
-    if not tokens:
+    score, count = sentiment_engine.score(text, 'utils.analytics.analyze_sentiment')
+    if not count:
         return 0.0
-        
-    score = 0
-    for word in tokens:
-        clean_word = ''.join(c for c in word if c.isalnum())
-        if clean_word in pos_words:
-            score += 1
-        elif clean_word in neg_words:
-            score -= 1
-    
+
     # Normalize and scale score based on token count
-    sentiment = score / len(tokens)
+    sentiment = score / count
     return round(max(min(sentiment * 5, 1.0), -1.0), 2)
 
 
@@ -1,6 +1,9 @@
 # Add a text cleaning utility to strip Markdown syntax and URLs from post content.
 import re
 
+from sentiment import engine as sentiment_engine
+from tokenizer import LETTER_RUN_RE, analyze_text, count_words, tokenize
+
 def sanitize_post_text(text):
     """Removes Markdown syntax and URLs to provide clean text for word frequency analysis."""
     if not text:
@@ -25,18 +28,14 @@ def normalize_subreddit_name(name):
 
 # AI Improvement (2026-03-03)
 # Add a word frequency counter with stopword filtering to extract meaningful insights from post content.
-from collections import Counter
+
+WORD_FREQUENCY_STOP_WORDS = frozenset({'the', 'and', 'this', 'that', 'with', 'from', 'for', 'was', 'were', 'about', 'would', 'could', 'their', 'there'})
 
 def get_word_frequencies(texts, top_n=20):
     """Extracts the most frequent words from a list of strings, filtering out common stopwords."""
-    stopwords = {'the', 'and', 'this', 'that', 'with', 'from', 'for', 'was', 'were', 'about', 'would', 'could', 'their', 'there'}
-    all_words = []
-    for text in texts:
-        clean_text = sanitize_post_text(text)
-        # Extract words with 3+ characters and convert to lowercase
-        words = re.findall(r'\b\w{3,}\b', clean_text.lower())
-        all_words.extend([w for w in words if w not in stopwords])
-    return Counter(all_words).most_common(top_n)
+    # Words with 3+ characters from the sanitized text
+    cleaned = (sanitize_post_text(text) for text in texts)
+    return count_words(cleaned, stop_words=WORD_FREQUENCY_STOP_WORDS).most_common(top_n)
 
 
 # AI Improvement (2026-03-03)
@@ -75,12 +74,12 @@ def estimate_sentiment(text):
 # AI Improvement (2026-03-03)
 # Add a keyword extraction helper that filters out stop words.
 
+KEYWORD_STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'to', 'for', 'in', 'on', 'at', 'by', 'with', 'from', 'as', 'it', 'its', 'that', 'this', 'of', 'be', 'has', 'have', 'do', 'if', 'then', 'which', 'who', 'where', 'when', 'how'})
+
 def extract_keywords(text):
     """Extracts meaningful keywords from text by removing common stop words and punctuation."""
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'to', 'for', 'in', 'on', 'at', 'by', 'with', 'from', 'as', 'it', 'its', 'that', 'this', 'of', 'be', 'has', 'have', 'do', 'if', 'then', 'which', 'who', 'where', 'when', 'how'}
-    # Extract alphanumeric words of at least 3 characters and filter against stop words
-    words = re.findall(r'[a-z]{3,}', text.lower())
-    return [w for w in words if w not in stop_words]
+    # Runs of at least 3 letters, filtered against stop words
+    return tokenize(text, stop_words=KEYWORD_STOP_WORDS, pattern=LETTER_RUN_RE)
 
 
 # AI Improvement (2026-03-03)
@@ -115,31 +114,27 @@ def extract_phrases(text, n=2):
     Extracts n-gram phrases (default bigrams) from the text.
     Helpful for identifying trending topics that consist of multiple words.
     """
-    if not text:
-        return []
-    words = re.findall(r'\w+', text.lower())
-    if len(words) < n:
-        return []
-    return [' '.join(words[i:i+n]) for i in range(len(words)-n+1)]
+    return analyze_text(text, min_length=1, n=n)[1]
 
 
 # AI Improvement (2026-03-04)
 # Add a basic sentiment analysis helper to estimate the emotional tone of post content.
+sentiment_engine.add_lexicon(
+    'text_processing.estimate_sentiment',
+    {'excellent', 'great', 'good', 'amazing', 'helpful', 'love', 'best', 'cool', 'upvote'},
+    {'terrible', 'bad', 'awful', 'boring', 'useless', 'hate', 'worst', 'issue', 'wrong'})
+
 def estimate_sentiment(text):
     """
     Estimates text sentiment from -1.0 (negative) to 1.0 (positive) using keyword analysis.
     This provides a foundation for the roadmap's sentiment analysis feature.
     """
-    pos_words = {'excellent', 'great', 'good', 'amazing', 'helpful', 'love', 'best', 'cool', 'upvote'}
-    neg_words = {'terrible', 'bad', 'awful', 'boring', 'useless', 'hate', 'worst', 'issue', 'wrong'}
-    
-    words = re.findall(r'\w+', (text or "").lower())
-    if not words:
+    score, count = sentiment_engine.score(text, 'text_processing.estimate_sentiment')
+    if not count:
         return 0.0
-    
-    score = sum(1 for w in words if w in pos_words) - sum(1 for w in words if w in neg_words)
+
     # Normalize by word density to keep score within -1 to 1 range
-    normalized_score = score / (len(words) * 0.1 + 1)
+    normalized_score = score / (count * 0.1 + 1)
     return round(max(min(normalized_score, 1.0), -1.0), 2)
 
 
@@ -171,24 +166,20 @@ def remove_stopwords(text, extra_words=None):
 
 # AI Improvement (2026-03-05)
 # Add a basic sentiment analysis helper to evaluate the emotional tone of post content.
+sentiment_engine.add_lexicon(
+    'text_processing.calculate_sentiment_score',
+    {'great', 'good', 'excellent', 'amazing', 'helpful', 'awesome', 'best', 'happy'},
+    {'bad', 'awful', 'terrible', 'worst', 'horrible', 'useless', 'wrong', 'sad'})
 
 def calculate_sentiment_score(text):
     """
     Calculates a simple sentiment polarity score based on positive and negative word matches.
     Returns a float where > 0 is positive and < 0 is negative.
     """
-    if not text:
+    score, count = sentiment_engine.score(text, 'text_processing.calculate_sentiment_score')
+    if not count:
         return 0.0
-    
-    pos_words = {'great', 'good', 'excellent', 'amazing', 'helpful', 'awesome', 'best', 'happy'}
-    neg_words = {'bad', 'awful', 'terrible', 'worst', 'horrible', 'useless', 'wrong', 'sad'}
-    
-    tokens = re.findall(r'\w+', text.lower())
-    if not tokens:
-        return 0.0
-        
-    score = sum(1 for word in tokens if word in pos_words) - sum(1 for word in tokens if word in neg_words)
-    return round(score / len(tokens), 4)
+    return round(score / count, 4)
 
 
 # AI Improvement (2026-03-05)
@@ -250,13 +241,14 @@ def normalize_subreddit_name(name):
 # Add a basic lexicon-based sentiment analysis utility.
 
 
+sentiment_engine.add_lexicon(
+    'text_processing.estimate_sentiment_score',
+    {'good', 'great', 'best', 'amazing', 'love', 'awesome', 'excellent', 'positive', 'cool', 'helpful'},
+    {'bad', 'worst', 'terrible', 'hate', 'awful', 'poor', 'negative', 'useless', 'wrong', 'boring'})
+
 def estimate_sentiment_score(text):
     """Estimates sentiment score (-1.0 to 1.0) based on keyword matching."""
-    pos_words = {'good', 'great', 'best', 'amazing', 'love', 'awesome', 'excellent', 'positive', 'cool', 'helpful'}
-    neg_words = {'bad', 'worst', 'terrible', 'hate', 'awful', 'poor', 'negative', 'useless', 'wrong', 'boring'}
-    # Extract words while ignoring punctuation
-    words = re.findall(r'\w+', text.lower())
-    if not words:
+    score, count = sentiment_engine.score(text, 'text_processing.estimate_sentiment_score')
+    if not count:
         return 0.0
-    sentiment_sum = sum((1 if word in pos_words else -1 if word in neg_words else 0) for word in words)
-    return round(sentiment_sum / len(words), 4)
+    return round(score / count, 4)